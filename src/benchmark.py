@@ -0,0 +1,197 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import warnings
+from contextlib import contextmanager
+
+from bs4.element import PageElement
+from lxml import etree
+
+import converter
+import synthetic
+
+# Замеры времени и памяти всех этапов конвертации на синтетических школах разного размера.
+# Результаты дописываются в JSON-файл, новый прогон сравнивается с предыдущим.
+DEFAULT_SIZES = ['10x7x6', '40x8x6', '150x8x6']  # классов x уроков x дней
+DEFAULT_RESULTS = 'benchmark.json'
+PIPELINES = [('soup', 'soup'), ('iterparse', 'xpath')]  # (NSParser, HTMLParser)
+REGRESSION_THRESHOLD = 0.1
+TREE_TYPES = (PageElement, etree._Element, etree._ElementUnicodeResult)  # узлы и "умные" строки деревьев разбора
+
+
+class StageTimer:
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.results = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.memory:
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        # для памяти - пик выделенного за время этапа сверх уже занятого
+        self.results[name] = tracemalloc.get_traced_memory()[1] - allocated if self.memory else elapsed
+
+
+def run_pipeline(html, nsxml, output, ns_engine, html_engine, timer):
+    ns_parser = converter.NS_PARSERS[ns_engine](detach=True)
+    with timer.stage('NSParser.load'):
+        ns_parser.load(nsxml)
+    with timer.stage('NSParser.parse_all'):
+        ns_parser.parse_all()
+
+    html_parser = converter.HTML_PARSERS[html_engine](detach=True)
+    html_parser.set_classes(ns_parser.plans)
+    with timer.stage('HTMLParser.load'):
+        html_parser.load(html)
+    with timer.stage('HTMLParser.parse'):
+        html_parser.parse()
+    with timer.stage('HTMLParser.get_subjects_set'):
+        html_parser.get_subjects_set()
+
+    with timer.stage('match_subjects'):
+        html_parser.match_subjects(ns_parser)
+    with timer.stage('save_all'):
+        writer = converter.NSWriter.from_plan(html_parser.compile())
+        writer.write(nsxml, output)
+
+    lessons_dump = [(class_.name, lesson.name, lesson.teacher_with_group, lesson.room, lesson.day.id, lesson.number)
+                    for class_ in html_parser.classes for lesson in class_.lessons]
+    return lessons_dump, count_trees(ns_parser, html_parser)
+
+
+def count_trees(*roots):  # объекты деревьев bs4/lxml, достижимые из парсеров после разбора (должно быть 0)
+    seen = set()
+    stack = list(roots)
+    trees = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, TREE_TYPES):
+            trees += 1
+        else:
+            stack.extend(gc.get_referents(obj))
+    return trees
+
+
+def benchmark_size(size, directory, repeat):
+    classes, lessons, days = map(int, size.split('x'))
+    html, nsxml = synthetic.School(classes, lessons, days).write(directory, size)
+    output = os.path.join(directory, size + '.out.nsxml')
+
+    results = {}
+    parsed = []
+    trees = 0
+    for ns_engine, html_engine in PIPELINES:
+        times = []
+        for i in range(repeat):
+            timer = StageTimer()
+            lessons_dump, pipeline_trees = run_pipeline(html, nsxml, output, ns_engine, html_engine, timer)
+            trees += pipeline_trees
+            times.append(timer.results)
+        parsed.append(lessons_dump)
+
+        tracemalloc.start()
+        try:
+            timer = StageTimer(memory=True)
+            run_pipeline(html, nsxml, output, ns_engine, html_engine, timer)
+        finally:
+            tracemalloc.stop()
+
+        results[f'{ns_engine}+{html_engine}'] = {
+            stage: {'time': min(run[stage] for run in times), 'peak': peak}
+            for stage, peak in timer.results.items()
+        }
+
+    parity = all(lessons_dump == parsed[0] for lessons_dump in parsed)
+    return results, parity, trees
+
+
+def load_runs(filename):
+    try:
+        with open(filename, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def find_previous(runs, size, pipeline, stage):
+    for run in reversed(runs):
+        try:
+            return run['results'][size][pipeline][stage]
+        except KeyError:
+            continue
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк этапов конвертации на синтетических данных')
+    parser.add_argument('-s', '--size', action='append', help='размер школы: классов x уроков x дней, например 40x8x6')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='повторов для замера времени')
+    parser.add_argument('-o', '--results', default=DEFAULT_RESULTS, help='файл с историей результатов')
+    parser.add_argument('--label', default=None, help='метка прогона (версия, коммит)')
+    parser.add_argument('--keep', metavar='DIR', help='сохранить сгенерированные файлы в каталог')
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore', message='It looks like you.re using an HTML parser')  # NSXML через soup
+
+    runs = load_runs(args.results)
+    run = {
+        'label': args.label or f'model-v{converter.MODEL_VERSION}',
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.keep:
+            directory = args.keep
+            os.makedirs(directory, exist_ok=True)
+
+        regressions = 0
+        failed = 0  # размеров, где движки расходятся или остались деревья разбора
+        for size in args.size or DEFAULT_SIZES:
+            results, parity, trees = benchmark_size(size, directory, args.repeat)
+            run['results'][size] = results
+            failed += not parity or bool(trees)
+
+            print(f'\n{size} (классов x уроков x дней){"" if parity else "  !!! результаты движков расходятся"}'
+                  f'{f"  !!! после разбора в памяти остались узлы деревьев: {trees}" if trees else ""}')
+            for pipeline, stages in results.items():
+                print(f'  {pipeline}')
+                for stage, result in stages.items():
+                    line = f'    {stage:30} {result["time"] * 1000:10.1f} мс {result["peak"] / 2 ** 20:8.1f} МиБ'
+                    previous = find_previous(runs, size, pipeline, stage)
+                    if previous:
+                        change = result['time'] / previous['time'] - 1 if previous['time'] else 0
+                        marker = '  !' if change > REGRESSION_THRESHOLD else ''
+                        regressions += bool(marker)
+                        line += f' {change:+8.1%}{marker}'
+                    print(line)
+
+    runs.append(run)
+    with open(args.results, 'w', encoding='utf-8') as f:
+        json.dump(runs, f, ensure_ascii=False, indent=1)
+
+    if regressions:
+        print(f'\nЗамедление более {REGRESSION_THRESHOLD:.0%} относительно прошлого прогона: {regressions} этапов')
+    if failed:
+        print(f'\n!!! проверка результатов и памяти не пройдена для размеров: {failed}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import pickle
+import zlib
+
+import converter
+
+# Кэш разобранных моделей на диске. Ключ - хэш содержимого файла и версия моделей,
+# старые записи удаляются (LRU по времени последнего обращения), когда кэш превышает max_size.
+DEFAULT_DIRECTORY = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                 'chngf-to-nsxml')
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+EXTENSION = '.model'
+
+
+class ModelCache:
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, filename, *extra):
+        file_hash = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                file_hash.update(chunk)
+
+        key = hashlib.sha256(f'{converter.MODEL_VERSION}:{file_hash.hexdigest()}'.encode())
+        for value in extra:
+            key.update(f':{value}'.encode())
+        return key.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key + EXTENSION)
+
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                model = pickle.loads(zlib.decompress(f.read()))
+            os.utime(path)  # отмечаем обращение для LRU
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError, AttributeError, ImportError):
+            self.remove(path)  # повреждённая или устаревшая запись
+            return None
+        return model
+
+    def put(self, key, model):
+        path = self.get_path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(zlib.compress(pickle.dumps(model, pickle.HIGHEST_PROTOCOL)))
+            os.replace(path + '.tmp', path)
+            self.evict()
+        except OSError:  # кэш необязателен, ошибки записи не мешают загрузке
+            pass
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(EXTENSION):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(entry[1] for entry in entries)
+        for mtime, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            self.remove(path)
+            size -= entry_size
+
+    def load_ns(self, parser, filename):
+        key = self.key(filename, 'ns')
+        model = self.get(key)
+        if model is None:
+            parser.load(filename)
+            parser.parse_all()
+            self.put(key, parser.get_model())
+        else:
+            parser.set_model(model)
+
+    def load_html(self, parser, filename, ns_classes):
+        key, model = self.prepare_html(parser, filename)
+        self.parse_html(parser, filename, key, model, ns_classes)
+
+    def prepare_html(self, parser, filename):  # не зависит от NSXML, можно выполнять параллельно с load_ns
+        key = self.key(filename, 'html')
+        model = self.get(key)
+        if model is None:
+            parser.load(filename)
+        return key, model
+
+    def parse_html(self, parser, filename, key, model, ns_classes):
+        parser.set_classes(ns_classes)
+
+        # Уроки распределяются по классам по номеру столбца, поэтому модель подходит при том же количестве классов
+        if model is not None and len(model[2]) == len(parser.classes):
+            parser.set_model(model)
+            return
+
+        if parser.table is None:
+            parser.load(filename)
+        parser.parse()
+        self.put(key, parser.get_model())
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cache
+import conflicts
+import converter
+import database
+import instrumentation
+import mappings
+import preflight
+from exceptions import HTMLConflictException
+
+# Манифест - JSON-список заданий:
+# [{"html": "school.html", "nsxml": "school.nsxml", "mapping": "school.json", "output": "result.nsxml"}, ...]
+# mapping (необязательно) - соответствия предметов {класс: {id урока NS: "Предмет — Учитель"}} или файл
+# сохранённых в GUI соответствий (mappings.json). Без mapping предметы сопоставляются автоматически.
+# school (необязательно) - название школы в базе SQLite, по умолчанию имя файла результата (или HTML).
+JOB_KEYS = ('html', 'nsxml', 'output')
+OPTIONAL_KEYS = ('mapping',)
+
+
+def convert(html, nsxml, output=None, mapping=None, school=None, ns_engine='iterparse', html_engine='xpath',
+            cache_directory=None, match=False, check_conflicts=False, store=None, collect=False):
+    # NSXML пишется в output (если задан), при collect возвращаются строки школы для базы (database.collect)
+    with instrumentation.recorder.stage('preflight'):  # несовместимые файлы отбрасываются до полного разбора
+        preflight.check(html, nsxml)
+
+    ns_parser = converter.NS_PARSERS[ns_engine](detach=True)
+    html_parser = converter.HTML_PARSERS[html_engine](detach=True)
+
+    if cache_directory:
+        model_cache = cache.ModelCache(cache_directory)
+        model_cache.load_ns(ns_parser, nsxml)
+        model_cache.load_html(html_parser, html, ns_parser.plans)
+    else:
+        ns_parser.load(nsxml)
+        ns_parser.parse_all()
+
+        html_parser.load(html)
+        html_parser.set_classes(ns_parser.plans)
+        html_parser.parse()
+
+    if check_conflicts:  # накладки учителей и кабинетов не выгружаем
+        with instrumentation.recorder.stage('conflicts'):
+            found = conflicts.find_conflicts(html_parser)
+        if found:
+            raise HTMLConflictException('\n'.join([f'Накладок в расписании: {len(found)}', *map(str, found)]))
+
+    if mapping:
+        with open(mapping, encoding='utf-8') as f:
+            corellations = json.load(f)
+        if mappings.is_store(corellations):
+            mappings.MappingStore(mapping).load().apply(html_parser, ns_parser)
+        else:
+            html_parser.set_corellations(corellations, ns_parser)
+
+    if store:  # сохранённые в GUI соответствия для уроков, которых нет в mapping
+        mapping_store = mappings.MappingStore(store).load()
+        mapping_store.apply(html_parser, ns_parser)
+        stale = mapping_store.get_stale(ns_parser)
+        if stale:
+            print(f'[ВНИМАНИЕ] {output}: устаревших соответствий в {store}: {len(stale)}', file=sys.stderr)
+
+    if match or not mapping:  # недостающие соответствия подбираем автоматически
+        html_parser.get_subjects_set()
+        html_parser.match_subjects(ns_parser)
+
+    with instrumentation.recorder.stage('save_all', html_parser.get_counts):
+        plan = html_parser.compile()
+        if output:
+            writer = converter.NSWriter.from_plan(plan)
+            writer.write(nsxml, output)
+
+    if collect:  # в базу пишет родительский процесс, из пула возвращаются только строки
+        with instrumentation.recorder.stage('collect'):
+            return database.collect(school, ns_parser, html_parser, plan)
+
+
+def run_job(job, options, stats_file=None, profile_directory=None, memory=True):
+    # (время, текст ошибки или None, строки школы для базы или None)
+    instrumentation.recorder.configure(stats_file, memory)  # процессы пула не наследуют настройку родителя
+
+    start = time.perf_counter()
+    try:
+        with instrumentation.recorder.stage('convert'):
+            if profile_directory:
+                filename = os.path.join(profile_directory, job['school'] + '.prof')
+                with instrumentation.profile(filename):
+                    rows = convert(**job, **options)
+            else:
+                rows = convert(**job, **options)
+    except BaseException:
+        return time.perf_counter() - start, traceback.format_exc(), None
+    return time.perf_counter() - start, None, rows
+
+
+def run_jobs(jobs, options, workers=None, stats_file=None, profile_directory=None, db=None):
+    # Задания выполняются в пуле, разобранные школы пишет в базу db (если задана) только этот процесс
+    if db is not None:
+        options = {**options, 'collect': True}
+        batch = database.Batch(db)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, job, options, stats_file, profile_directory): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                elapsed, error, rows = future.result()
+            except BaseException:  # процесс-обработчик упал целиком
+                elapsed, error, rows = 0, traceback.format_exc(), None
+
+            if error:
+                failed += 1
+                print(f'[ОШИБКА] {elapsed:7.2f} с  {job.get("output", job["school"])}\n{error}', file=sys.stderr)
+                continue
+            if db is not None:
+                batch.add(rows)
+            print(f'[OK]     {elapsed:7.2f} с  {job.get("output", job["school"])}')
+
+    if db is not None:
+        batch.flush()
+    return failed
+
+
+def load_manifest(filename, required=JOB_KEYS):
+    with open(filename, encoding='utf-8') as f:
+        jobs = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(filename))
+    result = []
+    for i, job in enumerate(jobs, start=1):
+        missing = [key for key in required if key not in job]
+        if missing:
+            raise ValueError(f'Задание {i}: не указаны поля {", ".join(missing)}')
+        paths = {key: os.path.join(base, job[key]) for key in JOB_KEYS + OPTIONAL_KEYS if key in job}
+        paths['school'] = job.get('school') or os.path.splitext(os.path.basename(job.get('output', job['html'])))[0]
+        result.append(paths)
+    return result
+
+
+def add_options(parser):  # параметры конвертации, общие для cli.py и database.py ingest
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='количество процессов')
+    parser.add_argument('--ns-engine', choices=converter.NS_PARSERS, default='iterparse')
+    parser.add_argument('--html-engine', choices=converter.HTML_PARSERS, default='xpath')
+    parser.add_argument('--cache', metavar='DIR', help='каталог кэша разобранных файлов')
+    parser.add_argument('--match', action='store_true',
+                        help='автоматически сопоставить предметы, не указанные в mapping')
+    parser.add_argument('--conflicts', action='store_true',
+                        help='не сохранять расписание с накладками учителей и кабинетов')
+    parser.add_argument('--store', metavar='FILE', help='файл сохранённых соответствий предметов (mappings.json)')
+
+
+def get_options(args):
+    return {'ns_engine': args.ns_engine, 'html_engine': args.html_engine, 'cache_directory': args.cache,
+            'match': args.match, 'check_conflicts': args.conflicts, 'store': args.store and os.path.abspath(args.store)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Пакетная конвертация расписаний Хронографа в NSXML')
+    parser.add_argument('manifest', help='JSON-файл со списком заданий')
+    add_options(parser)
+    parser.add_argument('--database', metavar='FILE', help='записывать разобранные расписания в базу SQLite')
+    parser.add_argument('--stats', metavar='FILE', help='записывать время и память этапов в JSON-лог')
+    parser.add_argument('--profile', metavar='DIR', help='сохранять профиль cProfile каждого задания в каталог')
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+    stats_file = os.path.abspath(args.stats) if args.stats else None
+
+    jobs = load_manifest(args.manifest)
+    start = time.perf_counter()
+    db = database.Database(args.database) if args.database else None
+    try:
+        failed = run_jobs(jobs, get_options(args), args.jobs, stats_file, args.profile, db)
+    finally:
+        if db is not None:
+            db.close()
+
+    print(f'Готово: {len(jobs) - failed} из {len(jobs)} за {time.perf_counter() - start:.2f} с')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import numpy as np
+
+# Разобранное расписание Хронографа по столбцам: у каждого урока день, номер, класс, предмет, группа и кабинет.
+# Строки заменены номерами в словарях (subjects, groups, rooms), поэтому сопоставление с уроками NS,
+# подсчёт несопоставленных и раскладка по (день, урок) для <Week> выполняются над массивами целиком.
+NO_GROUP = -1
+UNMAPPED = -1
+
+
+class ExportPlan:
+    # Сопоставление, собранное один раз после проверки: id урока NS (csg) каждого урока Хронографа, готовая
+    # раскладка <Week> и покрытие по классам. Не ссылается на строки предметов и сами классы, поэтому
+    # повторные сохранения и сохранения в файлы NS других недель пишут готовую раскладку.
+    def __init__(self, csg, lesson_ids, week, coverage):
+        self.csg = csg  # номер id урока NS у каждого урока Хронографа (по порядку классов и уроков) или UNMAPPED
+        self.lesson_ids = lesson_ids
+        self.week = week  # week[день][номер урока] - id уроков NS
+        self.coverage = coverage  # {класс: {'lessons': уроков, 'mapped': сопоставлено, 'unmapped': [предметы]}}
+
+    def get_unmapped(self):  # {класс: уроков без соответствия в NS}
+        return {name: coverage['lessons'] - coverage['mapped'] for name, coverage in self.coverage.items()}
+
+
+def encode(values):  # (номера значений, словарь значений в порядке первого появления)
+    dictionary = {}
+    codes = np.array([dictionary.setdefault(value, len(dictionary)) for value in values], np.int32)
+    return codes, list(dictionary)
+
+
+class ColumnarTimetable:
+    def __init__(self, classes):
+        self.classes = classes
+
+        self.lessons = lessons = [lesson for class_ in classes for lesson in class_.lessons]
+        self.class_ = np.repeat(np.arange(len(classes), dtype=np.int32), [len(class_.lessons) for class_ in classes])
+        self.day = np.array([lesson.day.id for lesson in lessons], np.int32)
+        self.number = np.array([lesson.number for lesson in lessons], np.int32)
+        self.room, self.rooms = encode([lesson.room for lesson in lessons])
+        self.teacher, self.teachers = encode([lesson.teacher for lesson in lessons])  # учитель без номера группы
+
+        groups = {}
+        self.group = np.array([groups.setdefault(lesson.group_number, len(groups))
+                               if lesson.group_number is not None else NO_GROUP for lesson in lessons], np.int32)
+        self.groups = list(groups)
+
+        # Предмет - пара (название, учитель с группой), строки 'Предмет — Учитель' собираются только для пар
+        self.name, self.names = encode([lesson.name for lesson in lessons])
+        teachers, teacher_values = encode([lesson.teacher_with_group for lesson in lessons])
+        pairs, subject = np.unique(self.name.astype(np.int64) * len(teacher_values) + teachers, return_inverse=True)
+        self.subject = subject.astype(np.int32).reshape(-1)
+        self.subjects = [f'{self.names[pair // len(teacher_values)]} — {teacher_values[pair % len(teacher_values)]}'
+                         for pair in pairs.tolist()]
+        self.subjects_index = {subject: subject_i for subject_i, subject in enumerate(self.subjects)}
+
+    def __len__(self):
+        return len(self.day)
+
+    def get_corellations(self):  # (номер id урока NS у каждого урока или UNMAPPED, список id уроков NS)
+        subjects = self.subjects_index
+        lesson_ids = {}
+        pairs = {}  # класс * число предметов + предмет -> номер id урока NS
+        for class_i, class_ in enumerate(self.classes):
+            for ns_lesson, subject in class_.corellations.items():  # при повторах предмета берётся последний урок
+                subject_i = subjects.get(subject)
+                if subject_i is not None:
+                    pairs[class_i * len(subjects) + subject_i] = lesson_ids.setdefault(ns_lesson.id, len(lesson_ids))
+
+        if not pairs:
+            return np.full(len(self), UNMAPPED, np.int32), []
+
+        keys = np.array(sorted(pairs), np.int64)
+        values = np.array([pairs[key] for key in keys.tolist()], np.int32)
+        lessons = self.class_.astype(np.int64) * len(subjects) + self.subject
+        found = np.searchsorted(keys, lessons).clip(max=len(keys) - 1)
+        return np.where(keys[found] == lessons, values[found], UNMAPPED).astype(np.int32), list(lesson_ids)
+
+    def get_unmapped(self, csg=None):  # {класс: уроков без соответствия в NS}
+        if csg is None:
+            csg = self.get_corellations()[0]
+        unmapped = np.bincount(self.class_[csg == UNMAPPED], minlength=len(self.classes))
+        return {class_.name: int(count) for class_, count in zip(self.classes, unmapped.tolist())}
+
+    def get_week(self, lessons_number, days_number, corellations=None):  # week[день][номер урока] - id уроков NS
+        csg, lesson_ids = corellations or self.get_corellations()
+        mapped = csg != UNMAPPED
+        slot = self.day[mapped] * lessons_number + self.number[mapped]
+        order = np.argsort(slot, kind='stable')  # внутри урока порядок классов и групп как в таблице
+
+        lesson_ids = np.array(lesson_ids, dtype=object)[csg[mapped][order]]
+        sizes = np.bincount(slot, minlength=days_number * lessons_number)
+        slots = np.split(lesson_ids, np.cumsum(sizes)[:-1])
+        return [[slots[day * lessons_number + number].tolist() for number in range(lessons_number)]
+                for day in range(days_number)]
+
+    def compile(self, lessons_number, days_number):
+        corellations = self.get_corellations()
+        csg, lesson_ids = corellations
+        unmapped = csg == UNMAPPED
+
+        lessons = np.bincount(self.class_, minlength=len(self.classes)).tolist()
+        missing = np.bincount(self.class_[unmapped], minlength=len(self.classes)).tolist()
+        coverage = {class_.name: {'lessons': lessons[class_i], 'mapped': lessons[class_i] - missing[class_i],
+                                  'unmapped': []}
+                    for class_i, class_ in enumerate(self.classes)}
+
+        pairs = np.unique(self.class_[unmapped].astype(np.int64) * len(self.subjects) + self.subject[unmapped])
+        for pair in pairs.tolist():  # несопоставленные предметы без повторов
+            coverage[self.classes[pair // len(self.subjects)].name]['unmapped'].append(
+                self.subjects[pair % len(self.subjects)])
+        for class_coverage in coverage.values():
+            class_coverage['unmapped'].sort()
+
+        return ExportPlan(csg, lesson_ids, self.get_week(lessons_number, days_number, corellations), coverage)
@@ -0,0 +1,130 @@
+import argparse
+import sys
+
+import converter
+import preflight
+
+# Проверка сетки перед выгрузкой: учитель или кабинет в одном уроке (день, номер) у разных классов.
+# Уроки берутся из столбцов ColumnarTimetable и раскладываются по ключам (урок, учитель) и (урок, кабинет)
+# в словари за один проход, поэтому проверка линейна и подходит для выгрузки целого района.
+# Объединённые уроки (один предмет в одном кабинете у нескольких классов) конфликтом не считаются.
+# Кабинеты групп в ячейке записаны через "/" ("201/202") и сопоставляются группам по порядку.
+TEACHER = 'teacher'
+ROOM = 'room'
+
+
+class Conflict:
+    __slots__ = ('kind', 'day', 'number', 'value', 'lessons')
+
+    def __init__(self, kind, day, number, value, lessons):
+        self.kind = kind  # TEACHER или ROOM
+        self.day = day
+        self.number = number
+        self.value = value  # учитель или кабинет
+        self.lessons = lessons  # [(класс, урок)]
+
+    def __str__(self):
+        what = f'учитель {self.value}' if self.kind == TEACHER else f'кабинет {self.value}'
+        lessons = ', '.join(f'{class_.name}: {lesson.name} ({lesson.teacher_with_group}, {lesson.room})'
+                            for class_, lesson in self.lessons)
+        return f'{self.day.name.title()}, {self.number + 1} урок - {what}: {lessons}'
+
+    def __repr__(self):
+        return str(self)
+
+
+def index(keys, class_):  # {ключ: [номера всех уроков с ключом]} только для ключей, встречающихся у разных классов
+    groups = {}
+    for lesson_i, key in enumerate(keys):
+        if key is not None:  # пустой учитель или кабинет
+            groups.setdefault(key, []).append(lesson_i)
+    return {key: lesson_ids for key, lesson_ids in groups.items()
+            if len(lesson_ids) > 1 and len({class_[lesson_i] for lesson_i in lesson_ids}) > 1}
+
+
+def get_group_rooms(rooms, room, class_, slot):
+    # [кабинеты урока] для каждого урока: в ячейке с группами "201/202" у i-й группы i-й кабинет,
+    # если число кабинетов не совпадает с числом групп - все кабинеты ячейки
+    cells = {}
+    for lesson_i, cell in enumerate(zip(class_, slot)):
+        cells.setdefault(cell, []).append(lesson_i)
+
+    group_rooms = [None] * len(room)
+    for lesson_ids in cells.values():
+        for position, lesson_i in enumerate(lesson_ids):
+            names = rooms[room[lesson_i]]
+            group_rooms[lesson_i] = [names[position]] if len(names) == len(lesson_ids) > 1 else names
+    return group_rooms
+
+
+def find_conflicts(html_parser):  # [Conflict] по разобранной сетке
+    columns = html_parser.get_columns()
+    lessons = columns.lessons
+    classes = columns.classes
+    class_ = columns.class_.tolist()
+    slots_number = (int(columns.number.max()) + 1) if len(columns) else 0
+    slot = (columns.day.astype('int64') * slots_number + columns.number).tolist()
+
+    def build(kind, lesson_ids, value):
+        lesson = lessons[lesson_ids[0]]
+        return Conflict(kind, lesson.day, lesson.number, value,
+                        [(classes[class_[lesson_i]], lessons[lesson_i]) for lesson_i in lesson_ids])
+
+    conflicts = []
+
+    rooms = [[name.strip() for name in room.split('/') if name.strip()] for room in columns.rooms]
+    group_rooms = get_group_rooms(rooms, columns.room.tolist(), class_, slot)
+
+    # учитель: ведёт у разных классов разные уроки или в разных кабинетах (своих кабинетах групп)
+    teachers = len(columns.teachers)
+    empty = columns.teachers.index('') if '' in columns.teachers else None
+    keys = [None if teacher == empty else slot_i * teachers + teacher
+            for slot_i, teacher in zip(slot, columns.teacher.tolist())]
+    for key, lesson_ids in index(keys, class_).items():
+        if len({(lessons[lesson_i].name, tuple(group_rooms[lesson_i])) for lesson_i in lesson_ids}) > 1:
+            conflicts.append(build(TEACHER, lesson_ids, columns.teachers[key % teachers]))
+
+    # кабинет: занят у разных классов разными учителями
+    room_keys = []
+    room_lessons = []
+    for lesson_i, slot_i in enumerate(slot):
+        for name in group_rooms[lesson_i]:
+            room_keys.append((slot_i, name))
+            room_lessons.append(lesson_i)
+    room_classes = [class_[lesson_i] for lesson_i in room_lessons]
+    for (_, name), positions in index(room_keys, room_classes).items():
+        lesson_ids = [room_lessons[position] for position in positions]
+        if len({lessons[lesson_i].teacher for lesson_i in lesson_ids}) > 1:
+            conflicts.append(build(ROOM, lesson_ids, name))
+
+    conflicts.sort(key=lambda conflict: (conflict.day.id, conflict.number, conflict.kind, conflict.value))
+    return conflicts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Поиск накладок учителей и кабинетов в расписании Хронографа')
+    parser.add_argument('html')
+    parser.add_argument('nsxml')
+    parser.add_argument('--ns-engine', choices=converter.NS_PARSERS, default='iterparse')
+    parser.add_argument('--html-engine', choices=converter.HTML_PARSERS, default='xpath')
+    args = parser.parse_args(argv)
+
+    preflight.check(args.html, args.nsxml)
+    ns_parser = converter.NS_PARSERS[args.ns_engine](detach=True)
+    ns_parser.load(args.nsxml)
+    ns_parser.parse_all()
+
+    html_parser = converter.HTML_PARSERS[args.html_engine](detach=True)
+    html_parser.load(args.html)
+    html_parser.set_classes(ns_parser.plans)
+    html_parser.parse()
+
+    conflicts = find_conflicts(html_parser)
+    for conflict in conflicts:
+        print(conflict)
+    print(f'Накладок: {len(conflicts)}')
+    return 1 if conflicts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,40 @@
-from bs4 import BeautifulSoup
-from bs4 import NavigableString
+import hashlib
+import io
+import os
+import re
+import shutil
+import sys
 
 from exceptions import *
+from instrumentation import instrumented
+from sources import is_same_file, open_source
+
+MODEL_VERSION = 2  # увеличивать при изменении моделей или разбора файлов (сбрасывает кэш)
+
+# Повторяющиеся имена, кабинеты и предметы хранятся в одном экземпляре. sys.intern не удерживает строки, на которые
+# больше никто не ссылается, поэтому таблица не растёт в долгоживущих процессах (сервис, пул cli.py, watch, GUI)
+symbol = sys.intern
+
+
+# bs4, lxml и numpy импортируются при первой загрузке файла, а не при запуске программы
+class XPath:
+    # Выражение компилируется при первом обращении к атрибуту класса, затем используется готовое
+    def __init__(self, path, **kwargs):
+        self.path = path
+        self.kwargs = kwargs
+        self.compiled = None
+
+    def __get__(self, instance, owner):
+        if self.compiled is None:
+            from lxml import etree
+            self.compiled = etree.XPath(self.path, **self.kwargs)
+        return self.compiled
 
 
 # NSParser classes
 class Day:
+    __slots__ = ('id', 'name')
+
     def __init__(self, id, name):
         self.id = id
         self.name = name
@@ -15,19 +44,23 @@ class Day:
 
 
 class NSRoom:
+    __slots__ = ('id', 'name')
+
     def __init__(self, id, name):
         self.id = id
-        self.name = name
+        self.name = symbol(name)
 
     def __str__(self):
         return self.name
 
 
 class NSSubject:
+    __slots__ = ('id', 'name', 'abbr', 'teachers')
+
     def __init__(self, id, name, abbr):
         self.id = id
-        self.name = name
-        self.abbr = abbr
+        self.name = symbol(name)
+        self.abbr = symbol(abbr)
         self.teachers = []
 
     def add_teacher(self, teacher):
@@ -38,53 +71,60 @@ class NSSubject:
 
 
 class NSTeacher:
+    __slots__ = ('id', 'firstname', 'lastname', 'midname', 'name')
+
     def __init__(self, id, firstname, lastname, midname):
         self.id = id
-        self.firstname = firstname
-        self.lastname = lastname
-        self.midname = midname
-        self.name = f'{lastname} {firstname[0]}.{midname[0]}.'
+        self.firstname = symbol(firstname)
+        self.lastname = symbol(lastname)
+        self.midname = symbol(midname)
+        self.name = symbol(f'{lastname} {firstname[0]}.{midname[0]}.')
 
     def __str__(self):
         return self.name
 
 
 class NSLesson:
+    __slots__ = ('id', 'name', 'teacher', 'subject')
+
     def __init__(self, id, name):
         self.id = id
-        self.name = name
+        self.name = symbol(name)
 
         self.teacher = None
         self.subject = None
 
-    def set_teacher(self, teachers, id):
-        for teacher in teachers:
-            if teacher.id == id:
-                self.teacher = teacher
+    def set_teacher(self, teachers, id):  # teachers - словарь {id: учитель}
+        self.teacher = teachers.get(id)
 
-    def set_subject(self, subjects, id):
-        for subject in subjects:
-            if subject.id == id:
-                self.subject = subject
+    def set_subject(self, subjects, id):  # subjects - словарь {id: предмет}
+        self.subject = subjects.get(id)
 
     def __str__(self):
         return self.name
 
 
 class NSClass:
+    __slots__ = ('id', 'name', 'grade', 'letter', 'boys', 'girls', 'students', 'plan', 'lessons_by_id',
+                 'lessons_by_name', 'timetable_subjects')
+
     def __init__(self, id, name, boys, girls):
         self.id = id
-        self.name = name.upper()
+        self.name = symbol(name.upper())
         self.grade, self.letter = int(self.name[:-1]), self.name[-1]
         self.boys = int(boys)
         self.girls = int(girls)
         self.students = self.boys + self.girls
 
         self.plan = []
+        self.lessons_by_id = {}
+        self.lessons_by_name = {}
         self.timetable_subjects = set()
 
     def add_lesson(self, lesson):
         self.plan.append(lesson)
+        self.lessons_by_id[lesson.id] = lesson
+        self.lessons_by_name.setdefault(lesson.name, lesson)
 
     def __str__(self):
         return self.name
@@ -92,16 +132,19 @@ class NSClass:
 
 # HTML class
 class HTMLLesson:
+    __slots__ = ('name', 'teacher_with_group', 'group_number', 'teacher', 'room', 'day', 'number')
+
     def __init__(self, name, teacher, room, day, number):
-        self.name = name
+        self.name = symbol(name)
 
-        self.teacher_with_group = teacher
+        self.teacher_with_group = symbol(teacher)
         try:
-            self.group_number, self.teacher = teacher.split(':')
+            group_number, teacher = teacher.split(':')
+            self.group_number, self.teacher = symbol(group_number), symbol(teacher)
         except ValueError:
-            self.group_number, self.teacher = None, teacher
+            self.group_number, self.teacher = None, self.teacher_with_group
 
-        self.room = room.lower()
+        self.room = symbol(room.lower())
 
         self.day = day
         self.number = number
@@ -109,6 +152,9 @@ class HTMLLesson:
     def get_subject(self):
         return f'{self.name} — {self.teacher_with_group}'
 
+    def get_key(self):  # для сравнения уроков двух разборов
+        return self.name, self.teacher_with_group, self.room
+
     def __str__(self):
         return f'[{self.day.name.title()}][{self.number}] - {self.name} ({self.teacher_with_group})'
 
@@ -117,6 +163,8 @@ class HTMLLesson:
 
 
 class HTMLClass:
+    __slots__ = ('name', 'lessons', 'subjects', 'corellations')
+
     def __init__(self, name):
         self.name = name
         self.lessons = []
@@ -134,6 +182,101 @@ class HTMLClass:
         return self.name
 
 
+class SubjectMatcher:
+    # Автоматическое сопоставление уроков NS с предметами Хронографа ('Предмет — Учитель') одного класса
+    NGRAM_SIZE = 3
+    NAME_WEIGHT = 0.6
+    TEACHER_WEIGHT = 0.4
+    MIN_SCORE = 0.7
+
+    def __init__(self, subjects):
+        self.subjects = []  # (предмет, название, учитель, n-граммы названия, есть ли номер группы)
+        self.by_key = {}
+        self.by_ngram = {}
+
+        for subject in subjects:
+            name, teacher = subject.rsplit(' — ', 1)
+            grouped = ':' in teacher
+            name, teacher = self.normalize_name(name), self.normalize_teacher(teacher)
+            ngrams = self.get_ngrams(name)
+
+            index = len(self.subjects)
+            self.subjects.append((subject, name, teacher, ngrams, grouped))
+            self.by_key.setdefault((name, teacher), []).append(index)
+            for ngram in ngrams:
+                self.by_ngram.setdefault(ngram, []).append(index)
+
+    @staticmethod
+    def normalize_name(name):
+        return ' '.join(name.casefold().replace('ё', 'е').split())
+
+    @staticmethod
+    def normalize_teacher(teacher):  # '1:Иванов И. И.' -> 'иванов и.и.'
+        parts = teacher.split(':')[-1].casefold().replace('ё', 'е').replace('.', ' ').split()
+        if not parts:
+            return ''
+        return parts[0] + ' ' + ''.join(f'{initial[0]}.' for initial in parts[1:])
+
+    def get_ngrams(self, name):
+        name = f' {name} '
+        return {name[i:i + self.NGRAM_SIZE] for i in range(len(name) - self.NGRAM_SIZE + 1)}
+
+    def get_key(self, ns_lesson):
+        teacher = ns_lesson.teacher.name if ns_lesson.teacher else ''
+        return self.normalize_name(ns_lesson.name), self.normalize_teacher(teacher)
+
+    def rank(self, ns_lesson):  # [(оценка, предмет)] по убыванию оценки
+        name, teacher = self.get_key(ns_lesson)
+        ngrams = self.get_ngrams(name)
+        surname = teacher.split(' ')[0]
+
+        common = {}
+        for ngram in ngrams:
+            for index in self.by_ngram.get(ngram, ()):
+                common[index] = common.get(index, 0) + 1
+
+        ranked = []
+        for index, count in common.items():
+            subject, subject_name, subject_teacher, subject_ngrams, grouped = self.subjects[index]
+            name_score = 2 * count / (len(ngrams) + len(subject_ngrams))
+            if subject_teacher == teacher:
+                teacher_score = 1
+            elif surname and subject_teacher.split(' ')[0] == surname:
+                teacher_score = 0.5
+            else:
+                teacher_score = 0
+            ranked.append((self.NAME_WEIGHT * name_score + self.TEACHER_WEIGHT * teacher_score, subject))
+
+        ranked.sort(key=lambda item: (-item[0], item[1]))
+        return ranked
+
+    def match(self, ns_lessons):  # {урок NS: предмет}, каждый предмет используется один раз
+        result = {}
+        used = set()
+
+        candidates = []
+        for lesson_i, ns_lesson in enumerate(ns_lessons):
+            exact = self.by_key.get(self.get_key(ns_lesson), ())
+            for index in sorted(exact, key=lambda i: self.subjects[i][4]):  # точное совпадение, сначала без групп
+                subject = self.subjects[index][0]
+                if subject not in used:
+                    result[ns_lesson] = subject
+                    used.add(subject)
+                    break
+            else:
+                candidates.extend((score, lesson_i, subject) for score, subject in self.rank(ns_lesson)
+                                  if score >= self.MIN_SCORE)
+
+        candidates.sort(key=lambda item: (-item[0], item[1], item[2]))
+        for score, lesson_i, subject in candidates:
+            ns_lesson = ns_lessons[lesson_i]
+            if ns_lesson not in result and subject not in used:
+                result[ns_lesson] = subject
+                used.add(subject)
+
+        return result
+
+
 class TimetableConverter:
     DAYS = [Day(i, d) for i, d in enumerate(['понедельник', 'вторник', 'среда', 'четверг', 'пятница', 'суббота'])]
     LAST_LESSON_NUMBER = None
@@ -141,17 +284,25 @@ class TimetableConverter:
 
 
 class NSParser(TimetableConverter):
-    def __init__(self):
+    def __init__(self, detach=False):
         self.ns = None
+        self.detach = detach  # после разбора отпускать дерево файла, остаются только модели
 
         self.rooms = None
         self.teachers = None
         self.subjects = None
         self.plans = None
 
-    def load(self, filename):
-        with open(filename, encoding='windows-1251') as f:
-            ns = BeautifulSoup(f, 'lxml').find('timetableexchange').contents[1::2]
+        self.teachers_by_id = {}
+        self.subjects_by_id = {}
+        self.plans_by_name = {}
+
+    @instrumented
+    def load(self, source):  # путь, bytes или mmap
+        from bs4 import BeautifulSoup
+
+        with open_source(source) as (f, encoding):
+            ns = BeautifulSoup(f, 'lxml', from_encoding=encoding).find('timetableexchange').contents[1::2]
         self.ns = ns
 
     def get_teachers(self):
@@ -218,8 +369,8 @@ class NSParser(TimetableConverter):
             lessons_tags = class_tag.contents[1::2]
             for lesson_tag in lessons_tags:
                 lesson = NSLesson(lesson_tag.attrs['id'], lesson_tag.attrs['name'])
-                lesson.set_teacher(self.teachers, lesson_tag.attrs['tid'])
-                lesson.set_subject(self.subjects, lesson_tag.attrs['sid'])
+                lesson.set_teacher(self.teachers_by_id, lesson_tag.attrs['tid'])
+                lesson.set_subject(self.subjects_by_id, lesson_tag.attrs['sid'])
                 class_.add_lesson(lesson)
 
             plans.append(class_)
@@ -227,37 +378,270 @@ class NSParser(TimetableConverter):
         return plans
 
     def get_class_by_name(self, name):
-        for c in self.plans:
-            if c.name == name:
-                return c
-        else:
+        try:
+            return self.plans_by_name[name]
+        except KeyError:
             raise NSLoaderException
 
     def get_lesson_by_subject_name(self, subject_name, class_name):
         class_ = self.get_class_by_name(class_name)
-        subjects = class_.plan
 
-        for s in subjects:
-            if subject_name == s.name:
-                return s
-        else:
+        try:
+            return class_.lessons_by_name[subject_name]
+        except KeyError:
             raise NSLoaderException
 
+    def index_references(self):
+        self.teachers_by_id = {teacher.id: teacher for teacher in self.teachers}
+        self.subjects_by_id = {subject.id: subject for subject in self.subjects}
+
+    def index_plans(self):
+        self.plans_by_name = {}
+        for class_ in self.plans:
+            self.plans_by_name.setdefault(class_.name, class_)
+
+    @instrumented
     def parse_all(self):
         self.rooms = self.get_rooms()
         self.teachers = self.get_teachers()
         self.subjects = self.get_subjects()
+        self.index_references()  # нужны get_plan для связывания уроков
         self.plans = self.get_plan()
+        self.index_plans()
+        if self.detach:
+            self.release()
+
+    def release(self):  # дерево больше не нужно: модели содержат только обычные строки
+        self.ns = None
+
+    def get_model(self):
+        return self.rooms, self.teachers, self.subjects, self.plans
+
+    def get_counts(self):
+        plans = self.plans or []
+        return {'classes': len(plans), 'lessons': sum(len(class_.plan) for class_ in plans)}
+
+    def set_model(self, model):
+        self.rooms, self.teachers, self.subjects, self.plans = model
+        self.index_references()
+        self.index_plans()
+
+
+class NSIterParser(NSParser):
+    # Потоковый разбор NSXML за один проход, без построения дерева
+    def __init__(self, detach=False):
+        super().__init__(detach)
+        self.sections = None
+        self.lessons = None  # (урок, id учителя, id предмета)
+
+    @instrumented
+    def load(self, source):
+        sections = {}
+        self.lessons = []
+        path = []
+        class_ = None
+
+        from lxml import etree
+        with open_source(source) as (f, encoding):
+            events = etree.iterparse(f, events=('start', 'end'), encoding=encoding, recover=True, remove_comments=True,
+                                     remove_pis=True)
+            for event, tag in events:
+                if event == 'start':
+                    path.append(tag.tag.lower())
+                    if len(path) == 2:
+                        sections.setdefault(path[1], [])
+                    elif len(path) == 3 and path[1] == 'plan':
+                        attrs = self.get_attrs(tag)
+                        class_ = NSClass(attrs['id'], attrs['name'], attrs['boys'], attrs['girls'])
+                        sections['plan'].append(class_)
+                    continue
+
+                depth = len(path)
+                section = path[1] if depth > 1 else None
+                path.pop()
+
+                if depth == 3:
+                    attrs = self.get_attrs(tag)
+                    if section == 'teachers':
+                        sections[section].append(NSTeacher(attrs['tid'], attrs['firstname'], attrs['lastname'],
+                                                           attrs['middlename']))
+                    elif section == 'rooms':
+                        sections[section].append(NSRoom(attrs['id'], attrs['name']))
+                    elif section == 'subjects':
+                        sections[section].append(NSSubject(attrs['sid'], attrs['name'], attrs['abbr']))
+                elif depth == 4 and section == 'plan':
+                    attrs = self.get_attrs(tag)
+                    lesson = NSLesson(attrs['id'], attrs['name'])
+                    class_.add_lesson(lesson)
+                    self.lessons.append((lesson, attrs['tid'], attrs['sid']))
+                    continue  # урок очищается вместе с классом
+
+                if depth >= 3:  # освобождаем уже разобранные элементы
+                    tag.clear()
+                    parent = tag.getparent()
+                    while tag.getprevious() is not None:
+                        del parent[0]
+
+        self.sections = sections
+
+    @staticmethod
+    def get_attrs(tag):
+        return {key.lower(): value for key, value in tag.attrib.items()}
+
+    def get_section(self, name):
+        try:
+            return self.sections[name]
+        except KeyError:
+            raise NSParserException
+
+    def get_teachers(self):
+        return self.get_section('teachers')
+
+    def get_rooms(self):
+        return self.get_section('rooms')
+
+    def get_subjects(self):
+        return self.get_section('subjects')
+
+    def release(self):
+        super().release()
+        self.sections = None
+        self.lessons = None
+
+    def get_plan(self):
+        # Учителя и предметы могут идти после плана, поэтому связываем уроки только сейчас
+        plans = self.get_section('plan')
+        for lesson, teacher_id, subject_id in self.lessons:
+            lesson.set_teacher(self.teachers_by_id, teacher_id)
+            lesson.set_subject(self.subjects_by_id, subject_id)
+        return plans
+
+
+NS_PARSERS = {
+    'soup': NSParser,
+    'iterparse': NSIterParser,
+}
+
+
+class NSWriter(TimetableConverter):
+    # Потоковая запись NSXML: заменяет блок <Week> исходного файла, не загружая файл целиком
+    CHUNK_SIZE = 64 * 1024
+    WEEK_START = re.compile(r'<(week)\b([^>]*?)(/?)>', re.IGNORECASE)
+    WEEK_END = re.compile(r'</week\s*>', re.IGNORECASE)
+
+    def __init__(self, timetable, unmapped=None):
+        self.timetable = timetable  # timetable[день][номер урока] - список id уроков (csg)
+        self.unmapped = unmapped  # {класс: уроков Хронографа без соответствия}
+
+    @classmethod
+    def from_classes(cls, classes, lessons_number):
+        from columnar import ColumnarTimetable
+        return cls.from_columns(ColumnarTimetable(classes), lessons_number)
+
+    @classmethod
+    def from_columns(cls, columns, lessons_number):
+        return cls.from_plan(columns.compile(lessons_number, len(cls.DAYS)))
+
+    @classmethod
+    def from_plan(cls, plan):
+        return cls(plan.week, plan.get_unmapped())
+
+    def get_counts(self):
+        counts = {'lessons': sum(len(lessons) for day in self.timetable for lessons in day)}
+        if self.unmapped is not None:
+            counts['unmapped'] = sum(self.unmapped.values())
+        return counts
+
+    def iter_week(self):
+        for day in self.DAYS:
+            yield f'<Day id="{day.id + 1}" name="{day.name}" wd="{day.id + 2}" >\n'
+            for lesson_number, lessons in enumerate(self.timetable[day.id], start=1):
+                yield f'\t<Lesson timeId="{lesson_number}">\n'
+                for lesson_id in lessons:
+                    yield f'\t\t<csg id="{lesson_id}"/>\n'
+                yield '\t</Lesson>\n'
+            yield '</Day>\n'
+
+    def search(self, source, buffer, pattern, destination=None):
+        # Читает source кусками, пока не найдёт pattern. Всё до совпадения пишется в destination (если задан)
+        while True:
+            match = pattern.search(buffer)
+            if match:
+                if destination is not None:
+                    destination.write(buffer[:match.start()])
+                return match, buffer
+
+            chunk = source.read(self.CHUNK_SIZE)
+            if not chunk:
+                raise NSWriterException
+
+            if destination is not None:
+                keep = buffer.rfind('<')  # незаконченный тег может продолжиться в следующем куске
+            else:
+                keep = buffer.rfind('\n')  # сохраняем отступ строки с закрывающим тегом
+                if keep == -1:
+                    keep = buffer.rfind('<')
+            if keep == -1:
+                keep = len(buffer)
+
+            if destination is not None:
+                destination.write(buffer[:keep])
+            buffer = buffer[keep:] + chunk
+
+    @instrumented
+    def write(self, source, destination):  # source - путь или bytes, результат в кодировке source
+        if is_same_file(source, destination):  # source читается по ходу записи
+            raise NSWriterException(f'Результат нельзя записать в исходный файл {destination}')
+
+        # Пишется во временный файл рядом с destination, при ошибке destination остаётся прежним
+        temp = f'{destination}.tmp'
+        try:
+            self.write_file(source, temp)
+            os.replace(temp, destination)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def write_file(self, source, destination):
+        with open_source(source) as (f, encoding), open(destination, 'w', encoding=encoding) as dst:
+            src = io.TextIOWrapper(f, encoding=encoding)
+            match, buffer = self.search(src, '', self.WEEK_START, dst)
+            tag_name, tag_attrs, empty = match.groups()
+
+            dst.write(f'<{tag_name}{tag_attrs.rstrip() if empty else tag_attrs}>\n')
+            dst.writelines(self.iter_week())
+
+            if empty:  # <Week/>
+                dst.write(f'</{tag_name}>')
+                dst.write(buffer[match.end():])
+            else:
+                match, buffer = self.search(src, buffer[match.end():], self.WEEK_END)
+                line = buffer[:match.start()]
+                indent = line[line.rfind('\n') + 1:]
+                if not indent.strip():
+                    dst.write(indent)
+                dst.write(buffer[match.start():])
+
+            shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
 
 
 class HTMLParser(TimetableConverter):
-    def __init__(self):
+    def __init__(self, track_changes=False, detach=False):
         self.table = None
+        self.detach = detach  # после разбора отпускать строки сетки, остаются только модели
+        self.track_changes = track_changes  # запоминать хэши строк сетки для reparse
+        self.fingerprints = None
+        self.columns = None  # ColumnarTimetable, сбрасывается при изменении уроков
         self.classes = []
+        self.classes_by_name = {}
+
+    @instrumented
+    def load(self, source):  # путь, bytes или mmap
+        from bs4 import BeautifulSoup
 
-    def load(self, filename):
-        with open(filename, encoding='windows-1251') as f:
-            rasp = BeautifulSoup(f, 'lxml')
+        with open_source(source) as (f, encoding):
+            rasp = BeautifulSoup(f, 'lxml', from_encoding=encoding)
 
         full_table = list(rasp.find('table'))[::2]
         class_names, lessons = full_table[2], full_table[3:]
@@ -278,45 +662,237 @@ class HTMLParser(TimetableConverter):
         self.table = table
 
     def set_classes(self, ns_classes):
+        self.columns = None
         for ns_class in ns_classes:
-            self.classes.append(HTMLClass(ns_class.name))
+            class_ = HTMLClass(ns_class.name)
+            self.classes.append(class_)
+            self.classes_by_name.setdefault(class_.name, class_)
 
     def get_class_by_name(self, name):
-        for c in self.classes:
-            if c.name == name:
-                return c
-        else:
+        try:
+            return self.classes_by_name[name]
+        except KeyError:
             raise HTMLLoaderException
 
+    def get_corellations(self):  # {класс: {id урока NS: предмет Хронографа}}
+        return {class_.name: {ns_lesson.id: subject for ns_lesson, subject in class_.corellations.items()}
+                for class_ in self.classes}
+
+    def set_corellations(self, corellations, ns_parser):
+        for class_name, lessons in corellations.items():
+            class_ = self.get_class_by_name(class_name)
+            ns_class = ns_parser.get_class_by_name(class_name)
+            for lesson_id, subject in lessons.items():
+                try:
+                    class_.corellations[ns_class.lessons_by_id[lesson_id]] = subject
+                except KeyError:
+                    raise NSLoaderException
+
+    @instrumented
     def parse(self):
-        for day_num, day_name in enumerate(self.DAYS):  # день (пн, вт и т.д.)
+        self.columns = None
+        for day_num in range(self.WORKING_DAYS_NUMBER):  # день (пн, вт и т.д.)
             for lesson_num in range(self.LAST_LESSON_NUMBER):  # номер урока
-                lessons = self.table[day_num][lesson_num].contents
-                if lesson_num == 0:  # если 1-ый урок, обрезаем столбец с названием дня недели и расписанием звонков
-                    lessons = lessons[7::2]
-                else:
-                    lessons = lessons[5::2]  # убираем только расписание звонков
-
-                for class_i, class_ in enumerate(self.classes):
-                    lesson_block = lessons[class_i].contents
-                    if lesson_block and type(lesson_block[0]) != NavigableString:
-                        lesson_block, room_block = lesson_block[0].contents
-                        groups_number = len(lesson_block.contents) // 2
-                        for group_i in range(groups_number):
-                            lesson_name = lesson_block.contents[group_i * 2].text.lstrip('/')
-                            if not lesson_name:  # если в названии только "/"
-                                for group_r in range(group_i - 1, -1, -1):
-                                    lesson_name = lesson_block.contents[group_r * 2].text.lstrip('/')
-                                    if lesson_name:
-                                        break
-                            lesson = HTMLLesson(name=lesson_name,
-                                                teacher=lesson_block.contents[group_i * 2 + 1].text,
-                                                room=room_block.text,
-                                                day=self.DAYS[day_num],
-                                                number=lesson_num)
-                            self.classes[class_i].add_lesson(lesson)
+                for class_, lesson in self.parse_row(self.table[day_num][lesson_num], day_num, lesson_num):
+                    class_.add_lesson(lesson)
+
+        if self.track_changes:
+            self.fingerprints = self.get_fingerprints()
+        if self.detach:
+            self.release()
+
+    def release(self):
+        self.table = None
+
+    def parse_row(self, row, day_num, lesson_num):  # уроки всех классов из одной строки сетки: (класс, урок)
+        from bs4 import NavigableString
 
+        lessons = row.contents
+        if lesson_num == 0:  # если 1-ый урок, обрезаем столбец с названием дня недели и расписанием звонков
+            lessons = lessons[7::2]
+        else:
+            lessons = lessons[5::2]  # убираем только расписание звонков
+
+        for class_i, class_ in enumerate(self.classes):
+            lesson_block = lessons[class_i].contents
+            if lesson_block and type(lesson_block[0]) != NavigableString:
+                lesson_block, room_block = lesson_block[0].contents
+                groups_number = len(lesson_block.contents) // 2
+                for group_i in range(groups_number):
+                    lesson_name = lesson_block.contents[group_i * 2].text.lstrip('/')
+                    if not lesson_name:  # если в названии только "/"
+                        for group_r in range(group_i - 1, -1, -1):
+                            lesson_name = lesson_block.contents[group_r * 2].text.lstrip('/')
+                            if lesson_name:
+                                break
+                    yield class_, HTMLLesson(name=lesson_name,
+                                             teacher=lesson_block.contents[group_i * 2 + 1].text,
+                                             room=room_block.text,
+                                             day=self.DAYS[day_num],
+                                             number=lesson_num)
+
+    def get_row_markup(self, row):
+        return row.encode()
+
+    def get_fingerprints(self):  # {(день, урок): хэш разметки строки сетки}
+        return {(day_num, lesson_num): hashlib.blake2b(self.get_row_markup(row), digest_size=16).digest()
+                for day_num, rows in enumerate(self.table) for lesson_num, row in enumerate(rows)}
+
+    @instrumented
+    def reparse(self, filename):  # повторная загрузка файла: разбираются только строки сетки, хэш которых изменился
+        fingerprints = self.fingerprints
+        self.load(filename)
+        self.columns = None
+        self.fingerprints = self.get_fingerprints()
+        if fingerprints is None:  # прошлый разбор без отслеживания изменений - старые уроки сравниваем целиком
+            fingerprints = {}
+        rows = {row for row in self.fingerprints.keys() | fingerprints.keys()
+                if self.fingerprints.get(row) != fingerprints.get(row)}
+
+        previous = {}
+        for class_ in self.classes:
+            lessons = []
+            for lesson in class_.lessons:
+                row = lesson.day.id, lesson.number
+                if row in rows:
+                    previous.setdefault((class_, row), []).append(lesson)
+                else:
+                    lessons.append(lesson)
+            class_.lessons = lessons
+
+        current = {}
+        for row in sorted(rows):
+            if row in self.fingerprints:
+                for class_, lesson in self.parse_row(self.table[row[0]][row[1]], *row):
+                    current.setdefault((class_, row), []).append(lesson)
+                    class_.add_lesson(lesson)
+
+        for class_ in self.classes:  # сортировка устойчивая, порядок групп внутри урока сохраняется
+            class_.lessons.sort(key=lambda lesson: (lesson.day.id, lesson.number))
+            if class_.subjects:  # набор предметов уже строился - пересобираем без исчезнувших
+                class_.subjects = {lesson.get_subject() for lesson in class_.lessons}
+        if self.detach:
+            self.release()
+
+        # Изменения по сравнению с прошлым разбором: (класс, (день, урок), было, стало)
+        changes = []
+        for class_ in self.classes:
+            for row in sorted(rows):
+                old, new = previous.get((class_, row), []), current.get((class_, row), [])
+                if [lesson.get_key() for lesson in old] != [lesson.get_key() for lesson in new]:
+                    changes.append((class_, row, old, new))
+        return changes
+
+    @instrumented
     def get_subjects_set(self):
         for class_i, class_ in enumerate(self.classes):
             for lesson in class_.lessons:
                 class_.add_subject(lesson.get_subject())
+
+    @instrumented
+    def match_subjects(self, ns_parser):  # заполняет ещё не сопоставленные предметы, нужен get_subjects_set
+        matched = 0
+        for class_ in self.classes:
+            ns_class = ns_parser.get_class_by_name(class_.name)
+            used = set(class_.corellations.values())
+            lessons = [lesson for lesson in ns_class.plan if lesson not in class_.corellations]
+            subjects = sorted(subject for subject in class_.subjects if subject not in used)
+
+            for ns_lesson, subject in SubjectMatcher(subjects).match(lessons).items():
+                class_.corellations[ns_lesson] = subject
+                matched += 1
+
+        return matched
+
+    def get_columns(self):  # столбцовое представление уроков, строится один раз после разбора
+        if self.columns is None:
+            from columnar import ColumnarTimetable
+            self.columns = ColumnarTimetable(self.classes)
+        return self.columns
+
+    @instrumented
+    def compile(self):  # ExportPlan для сохранения по текущим соответствиям
+        return self.get_columns().compile(self.LAST_LESSON_NUMBER, len(self.DAYS))
+
+    def get_counts(self):
+        lessons = [lesson for class_ in self.classes for lesson in class_.lessons]
+        return {'classes': len(self.classes), 'lessons': len(lessons),
+                'groups': sum(lesson.group_number is not None for lesson in lessons)}
+
+    def get_model(self):  # уроки по порядку классов (столбцов таблицы)
+        return self.LAST_LESSON_NUMBER, self.WORKING_DAYS_NUMBER, [class_.lessons for class_ in self.classes]
+
+    def set_model(self, model):
+        self.LAST_LESSON_NUMBER, self.WORKING_DAYS_NUMBER, lessons = model
+        self.columns = None
+        for class_, class_lessons in zip(self.classes, lessons):
+            class_.lessons = class_lessons
+
+
+class HTMLXPathParser(HTMLParser):
+    # Разбор сетки расписания напрямую из дерева lxml заранее скомпилированными XPath-выражениями
+    ROWS = XPath('(//table)[1]/tr')
+    WEEK_COLUMN = XPath('(//td[@style=";text-align:left"])[1]')  # Блок с днем недели
+    WEEK_COLUMNS = XPath('//td[@style=";text-align:left" and @rowspan=$rowspan]')
+    CELLS = XPath('./td')
+    TEXT = XPath('string()', smart_strings=False)
+
+    @instrumented
+    def load(self, source):
+        from lxml import etree
+
+        with open_source(source) as (f, encoding):
+            rasp = etree.parse(f, etree.HTMLParser(encoding=encoding))
+
+        full_table = self.ROWS(rasp)
+        class_names, lessons = full_table[2], full_table[3:]
+
+        week_column_1 = self.WEEK_COLUMN(rasp)[0]
+        self.LAST_LESSON_NUMBER = int(week_column_1.get('rowspan'))  # Получаем кол-во уроков
+        self.WORKING_DAYS_NUMBER = len(self.WEEK_COLUMNS(rasp, rowspan=str(self.LAST_LESSON_NUMBER)))
+
+        assert self.LAST_LESSON_NUMBER == len(lessons) // self.WORKING_DAYS_NUMBER
+
+        table = []
+
+        for day in range(self.WORKING_DAYS_NUMBER):
+            table.append(lessons[day * self.LAST_LESSON_NUMBER:(day + 1) * self.LAST_LESSON_NUMBER])
+
+        self.table = table
+
+    def parse_row(self, row, day_num, lesson_num):
+        text = self.TEXT
+        lessons = self.CELLS(row)
+        if lesson_num == 0:  # если 1-ый урок, обрезаем столбец с названием дня недели и расписанием звонков
+            lessons = lessons[3:]
+        else:
+            lessons = lessons[2:]  # убираем только расписание звонков
+
+        for class_i, class_ in enumerate(self.classes):
+            lesson_block = lessons[class_i]
+            if len(lesson_block) and not lesson_block.text:  # ячейка начинается не с текста
+                lesson_block, room_block = lesson_block[0]
+                room = text(room_block)
+                groups_number = len(lesson_block) // 2
+                for group_i in range(groups_number):
+                    lesson_name = text(lesson_block[group_i * 2]).lstrip('/')
+                    if not lesson_name:  # если в названии только "/"
+                        for group_r in range(group_i - 1, -1, -1):
+                            lesson_name = text(lesson_block[group_r * 2]).lstrip('/')
+                            if lesson_name:
+                                break
+                    yield class_, HTMLLesson(name=lesson_name,
+                                             teacher=text(lesson_block[group_i * 2 + 1]),
+                                             room=room,
+                                             day=self.DAYS[day_num],
+                                             number=lesson_num)
+
+    def get_row_markup(self, row):
+        from lxml import etree
+        return etree.tostring(row, with_tail=False)
+
+
+HTML_PARSERS = {
+    'soup': HTMLParser,
+    'xpath': HTMLXPathParser,
+}
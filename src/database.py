@@ -0,0 +1,274 @@
+import argparse
+import datetime
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+
+import converter
+
+# База SQLite с разобранными расписаниями школ для запросов по району: накладки учителей между школами,
+# загрузка кабинетов и учителей. Учителя и предметы общие для всех школ (по имени), классы и кабинеты - свои
+# у каждой школы. lessons - сетка Хронографа с id урока NS (csg) после сопоставления, plan - план NS.
+# Школа при повторной загрузке заменяется целиком; строки вставляются executemany в одной транзакции.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS schools (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    imported TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS teachers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS subjects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS classes (
+    id INTEGER PRIMARY KEY,
+    school_id INTEGER NOT NULL REFERENCES schools (id) ON DELETE CASCADE,
+    ns_id TEXT,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rooms (
+    id INTEGER PRIMARY KEY,
+    school_id INTEGER NOT NULL REFERENCES schools (id) ON DELETE CASCADE,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plan (
+    id INTEGER PRIMARY KEY,
+    class_id INTEGER NOT NULL REFERENCES classes (id) ON DELETE CASCADE,
+    csg TEXT NOT NULL,
+    name TEXT NOT NULL,
+    subject_id INTEGER REFERENCES subjects (id),
+    teacher_id INTEGER REFERENCES teachers (id)
+);
+CREATE TABLE IF NOT EXISTS lessons (
+    id INTEGER PRIMARY KEY,
+    class_id INTEGER NOT NULL REFERENCES classes (id) ON DELETE CASCADE,
+    day INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    subject_id INTEGER NOT NULL REFERENCES subjects (id),
+    teacher_id INTEGER REFERENCES teachers (id),
+    group_number TEXT,
+    room_id INTEGER REFERENCES rooms (id),
+    csg TEXT
+);
+CREATE INDEX IF NOT EXISTS classes_school ON classes (school_id, name);
+CREATE INDEX IF NOT EXISTS rooms_school ON rooms (school_id, name);
+CREATE INDEX IF NOT EXISTS plan_class ON plan (class_id, csg);
+CREATE INDEX IF NOT EXISTS lessons_class ON lessons (class_id, day, number);
+CREATE INDEX IF NOT EXISTS lessons_teacher ON lessons (teacher_id, day, number);
+CREATE INDEX IF NOT EXISTS lessons_room ON lessons (room_id, day, number);
+CREATE INDEX IF NOT EXISTS lessons_csg ON lessons (csg);
+'''
+BUSY_TIMEOUT = 60  # с, школы могут записывать несколько процессов cli.py
+CACHE_SIZE = 64 * 1024  # КиБ страниц в памяти, вставки в индексы уроков идут вразброс
+BATCH = 20  # школ в одной транзакции при загрузке манифеста
+
+
+def collect(school, ns_parser, html_parser, plan=None):  # строки для Database.insert, можно передавать между процессами
+    columns = html_parser.get_columns()
+    if plan is None:
+        plan = columns.compile(html_parser.LAST_LESSON_NUMBER, len(html_parser.DAYS))
+
+    lesson_ids = plan.lesson_ids
+    teachers = [teacher or None for teacher in columns.teachers]
+    rooms = [room or None for room in columns.rooms]
+    lessons = list(zip(columns.class_.tolist(), columns.day.tolist(), columns.number.tolist(),
+                       [columns.names[name] for name in columns.name.tolist()],
+                       [teachers[teacher] for teacher in columns.teacher.tolist()],
+                       [lesson.group_number for lesson in columns.lessons],
+                       [rooms[room] for room in columns.room.tolist()],
+                       [lesson_ids[csg] if csg >= 0 else None for csg in plan.csg.tolist()]))
+
+    classes = []
+    ns_plan = []
+    for class_i, class_ in enumerate(html_parser.classes):
+        ns_class = ns_parser.plans_by_name.get(class_.name)
+        classes.append((class_.name, ns_class.id if ns_class else None))
+        for ns_lesson in ns_class.plan if ns_class else ():
+            ns_plan.append((class_i, ns_lesson.id, ns_lesson.name,
+                            ns_lesson.subject.name if ns_lesson.subject else None,
+                            ns_lesson.teacher.name if ns_lesson.teacher else None))
+
+    return {'school': school, 'classes': classes, 'plan': ns_plan, 'lessons': lessons}
+
+
+class Database:
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute(f'PRAGMA cache_size = -{CACHE_SIZE}')
+        self.connection.executescript(SCHEMA)
+        self.ids = {'teachers': {}, 'subjects': {}}  # имя -> id, общие для школ справочники
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        self.connection.execute('BEGIN IMMEDIATE')  # блокировка записи сразу, без взаимных ожиданий процессов
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            self.ids = {'teachers': {}, 'subjects': {}}  # id, добавленные в откатанной транзакции, больше не существуют
+            raise
+        self.connection.execute('COMMIT')
+
+    def get_ids(self, table, names):  # {имя: id} справочника, недостающие имена добавляются
+        ids = self.ids[table]
+        missing = sorted({name for name in names if name is not None and name not in ids})
+        if missing:
+            self.connection.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)',
+                                        [(name,) for name in missing])
+            for start in range(0, len(missing), 500):  # лимит параметров SQLite
+                chunk = missing[start:start + 500]
+                ids.update((name, id) for id, name in self.connection.execute(
+                    f'SELECT id, name FROM {table} WHERE name IN ({", ".join("?" * len(chunk))})', chunk))
+        return ids
+
+    def insert(self, rows):  # id школы
+        with self.transaction():
+            return self.insert_school(rows)
+
+    def insert_many(self, schools):  # несколько школ одной транзакцией
+        with self.transaction():
+            return [self.insert_school(rows) for rows in schools]
+
+    def insert_school(self, rows):  # вызывается внутри transaction
+        connection = self.connection
+        connection.execute('DELETE FROM schools WHERE name = ?', (rows['school'],))
+        school_id = connection.execute(
+            'INSERT INTO schools (name, imported) VALUES (?, ?)',
+            (rows['school'], datetime.datetime.now().isoformat(timespec='seconds'))).lastrowid
+
+        class_ids = [connection.execute('INSERT INTO classes (school_id, name, ns_id) VALUES (?, ?, ?)',
+                                        (school_id, name, ns_id)).lastrowid for name, ns_id in rows['classes']]
+        room_ids = {room: connection.execute('INSERT INTO rooms (school_id, name) VALUES (?, ?)',
+                                             (school_id, room)).lastrowid
+                    for room in sorted({lesson[6] for lesson in rows['lessons'] if lesson[6] is not None})}
+        room_ids[None] = None
+
+        teachers = self.get_ids('teachers', [lesson[4] for lesson in rows['lessons']] +
+                                [lesson[4] for lesson in rows['plan']])
+        subjects = self.get_ids('subjects', [lesson[3] for lesson in rows['lessons']] +
+                                [lesson[3] for lesson in rows['plan']])
+        teachers[None] = subjects[None] = None
+
+        connection.executemany(
+            'INSERT INTO lessons (class_id, day, number, subject_id, teacher_id, group_number, room_id, csg) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(class_ids[class_i], day, number, subjects[subject], teachers[teacher], group, room_ids[room], csg)
+             for class_i, day, number, subject, teacher, group, room, csg in rows['lessons']])
+        connection.executemany(
+            'INSERT INTO plan (class_id, csg, name, subject_id, teacher_id) VALUES (?, ?, ?, ?, ?)',
+            [(class_ids[class_i], csg, name, subjects[subject], teachers[teacher])
+             for class_i, csg, name, subject, teacher in rows['plan']])
+        return school_id
+
+    def add_school(self, school, ns_parser, html_parser, plan=None):
+        return self.insert(collect(school, ns_parser, html_parser, plan))
+
+    # Запросы
+
+    def get_schools(self):  # [(школа, классов, уроков)]
+        return self.connection.execute(
+            'SELECT s.name, COUNT(DISTINCT c.id), COUNT(l.id) FROM schools s '
+            'LEFT JOIN classes c ON c.school_id = s.id LEFT JOIN lessons l ON l.class_id = c.id '
+            'GROUP BY s.id ORDER BY s.name').fetchall()
+
+    def get_teacher_conflicts(self):  # [(учитель, день, урок, школы через запятую)] - учитель в разных школах
+        return self.connection.execute(
+            'SELECT t.name, l.day, l.number, GROUP_CONCAT(DISTINCT s.name) FROM lessons l '
+            'JOIN teachers t ON t.id = l.teacher_id JOIN classes c ON c.id = l.class_id '
+            'JOIN schools s ON s.id = c.school_id '
+            'GROUP BY l.teacher_id, l.day, l.number HAVING COUNT(DISTINCT c.school_id) > 1 '
+            'ORDER BY t.name, l.day, l.number').fetchall()
+
+    def get_room_load(self, school=None):  # [(школа, кабинет, уроков в неделю, занятых уроков сетки)]
+        return self.connection.execute(
+            'SELECT s.name, r.name, COUNT(*), COUNT(DISTINCT l.day * 100 + l.number) FROM lessons l '
+            'JOIN rooms r ON r.id = l.room_id JOIN schools s ON s.id = r.school_id '
+            'WHERE ?1 IS NULL OR s.name = ?1 GROUP BY r.id ORDER BY s.name, 4 DESC, r.name', (school,)).fetchall()
+
+    def get_teacher_load(self, school=None):  # [(учитель, уроков в неделю, школ)]
+        return self.connection.execute(
+            'SELECT t.name, COUNT(DISTINCT c.school_id * 10000 + l.day * 100 + l.number), '
+            'COUNT(DISTINCT c.school_id) FROM lessons l JOIN teachers t ON t.id = l.teacher_id '
+            'JOIN classes c ON c.id = l.class_id JOIN schools s ON s.id = c.school_id '
+            'WHERE ?1 IS NULL OR s.name = ?1 GROUP BY t.id ORDER BY 2 DESC, t.name', (school,)).fetchall()
+
+
+class Batch:  # школы копятся и пишутся одной транзакцией, COMMIT и сброс WAL на каждую школу дороже вставки
+    def __init__(self, database, size=BATCH):
+        self.database = database
+        self.size = size
+        self.schools = []
+
+    def add(self, rows):
+        self.schools.append(rows)
+        if len(self.schools) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.schools:
+            self.database.insert_many(self.schools)
+            self.schools = []
+
+
+def main(argv=None):
+    import cli  # cli импортирует этот модуль
+
+    parser = argparse.ArgumentParser(description='База SQLite с расписаниями школ района')
+    parser.add_argument('database', help='файл базы SQLite')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = commands.add_parser('ingest', help='загрузить школы из манифеста cli.py')
+    ingest_parser.add_argument('manifest', help='манифест cli.py, output необязателен')
+    cli.add_options(ingest_parser)
+
+    commands.add_parser('schools', help='загруженные школы')
+    commands.add_parser('conflicts', help='учителя, поставленные в один урок в разных школах')
+    for name, help in (('rooms', 'загрузка кабинетов'), ('teachers', 'загрузка учителей')):
+        command = commands.add_parser(name, help=help)
+        command.add_argument('-s', '--school', help='только одна школа')
+    args = parser.parse_args(argv)
+
+    days = converter.TimetableConverter.DAYS
+    start = time.perf_counter()
+    with Database(args.database) as database:
+        if args.command == 'ingest':
+            jobs = cli.load_manifest(args.manifest, required=('html', 'nsxml'))
+            failed = cli.run_jobs(jobs, cli.get_options(args), args.jobs, db=database)
+            print(f'Готово: {len(jobs) - failed} из {len(jobs)} за {time.perf_counter() - start:.2f} с')
+            return 1 if failed else 0
+
+        if args.command == 'schools':
+            for school, classes, lessons in database.get_schools():
+                print(f'{school}: классов {classes}, уроков {lessons}')
+        elif args.command == 'conflicts':
+            for teacher, day, number, schools in database.get_teacher_conflicts():
+                print(f'{teacher}: {days[day].name}, {number + 1} урок - {schools}')
+        elif args.command == 'rooms':
+            for school, room, lessons, slots in database.get_room_load(args.school):
+                print(f'{school}: кабинет {room} - уроков {lessons}, занят {slots}')
+        elif args.command == 'teachers':
+            for teacher, lessons, schools in database.get_teacher_load(args.school):
+                print(f'{teacher}: уроков {lessons}, школ {schools}')
+    print(f'Запрос выполнен за {(time.perf_counter() - start) * 1000:.0f} мс', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
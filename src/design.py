@@ -30,16 +30,13 @@ class Ui_MainWindow(object):
         self.classchoice.setObjectName("classchoice")
         self.horizontalLayout_top.addWidget(self.classchoice)
         self.verticalLayout.addLayout(self.horizontalLayout_top)
-        self.scrollArea = QtWidgets.QScrollArea(self.centralwidget)
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollArea.setObjectName("scrollArea")
-        self.scrollAreaWidgetContents = QtWidgets.QWidget()
-        self.scrollAreaWidgetContents.setGeometry(QtCore.QRect(0, 0, 704, 410))
-        self.scrollAreaWidgetContents.setObjectName("scrollAreaWidgetContents")
-        self.scrollbarLayout = QtWidgets.QVBoxLayout(self.scrollAreaWidgetContents)
-        self.scrollbarLayout.setObjectName("scrollbarLayout")
-        self.scrollArea.setWidget(self.scrollAreaWidgetContents)
-        self.verticalLayout.addWidget(self.scrollArea)
+        self.corellationsView = QtWidgets.QTableView(self.centralwidget)
+        self.corellationsView.setEditTriggers(QtWidgets.QAbstractItemView.AllEditTriggers)
+        self.corellationsView.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.corellationsView.setObjectName("corellationsView")
+        self.corellationsView.horizontalHeader().setStretchLastSection(True)
+        self.corellationsView.verticalHeader().setVisible(False)
+        self.verticalLayout.addWidget(self.corellationsView)
         self.horizontalLayout_bottom = QtWidgets.QHBoxLayout()
         self.horizontalLayout_bottom.setObjectName("horizontalLayout_bottom")
         self.checkButton = QtWidgets.QPushButton(self.centralwidget)
@@ -68,10 +65,23 @@ class Ui_MainWindow(object):
         self.action_NSXML.setObjectName("action_NSXML")
         self.load = QtWidgets.QAction(MainWindow)
         self.load.setObjectName("load")
+        self.cancelLoad = QtWidgets.QAction(MainWindow)
+        self.cancelLoad.setEnabled(False)
+        self.cancelLoad.setObjectName("cancelLoad")
+        self.saveOtherWeek = QtWidgets.QAction(MainWindow)
+        self.saveOtherWeek.setEnabled(False)
+        self.saveOtherWeek.setObjectName("saveOtherWeek")
+        self.saveWeeks = QtWidgets.QAction(MainWindow)
+        self.saveWeeks.setEnabled(False)
+        self.saveWeeks.setObjectName("saveWeeks")
         self.menu.addAction(self.actionHTML)
         self.menu.addAction(self.action_NSXML)
         self.menu.addSeparator()
         self.menu.addAction(self.load)
+        self.menu.addAction(self.cancelLoad)
+        self.menu.addSeparator()
+        self.menu.addAction(self.saveOtherWeek)
+        self.menu.addAction(self.saveWeeks)
         self.menuBar.addAction(self.menu.menuAction())
 
         self.retranslateUi(MainWindow)
@@ -87,4 +97,7 @@ class Ui_MainWindow(object):
         self.actionHTML.setText(_translate("MainWindow", "HTML (Хронограф)"))
         self.action_NSXML.setText(_translate("MainWindow", "NSXML (Сетевой город)"))
         self.load.setText(_translate("MainWindow", "Загрузить"))
+        self.cancelLoad.setText(_translate("MainWindow", "Отменить загрузку"))
+        self.saveOtherWeek.setText(_translate("MainWindow", "Сохранить для другой недели..."))
+        self.saveWeeks.setText(_translate("MainWindow", "Сохранить несколько недель..."))
 
@@ -10,6 +10,10 @@ class NSLoaderException(NSException):
     pass
 
 
+class NSWriterException(NSException):
+    pass
+
+
 class HTMLException(BaseException):
     pass
 
@@ -20,3 +24,11 @@ class HTMLParserException(HTMLException):
 
 class HTMLLoaderException(HTMLException):
     pass
+
+
+class HTMLConflictException(HTMLException):
+    pass
+
+
+class PreflightException(BaseException):
+    pass
@@ -1,10 +1,210 @@
+import os
 import sys  # sys нужен для передачи argv в QApplication
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
-from PyQt5 import QtWidgets
+from PyQt5 import QtCore, QtWidgets
 
+import cache
+import conflicts
 import converter
 import design  # Это наш конвертированный файл дизайна
+import mappings
+import preflight
+import weeks
+from exceptions import PreflightException
+from instrumentation import instrumented
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class LoadWorker(QtCore.QObject):
+    # Загрузка файлов в отдельном потоке: HTML и NSXML читаются параллельно
+    STAGES = 5
+
+    progress = QtCore.pyqtSignal(str)
+    loaded = QtCore.pyqtSignal(object, object, object)  # NSParser, HTMLParser, устаревшие соответствия
+    failed = QtCore.pyqtSignal(str, str)  # сообщение, traceback
+    cancelled = QtCore.pyqtSignal()
+    finished = QtCore.pyqtSignal()
+
+    def __init__(self, ch_file, ns_file, model_cache, mapping_store):
+        super().__init__()
+        self.ch_file = ch_file
+        self.ns_file = ns_file
+        self.cache = model_cache
+        self.mapping_store = mapping_store
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def stage(self, number, text):
+        if self.stopped.is_set():
+            raise LoadCancelled
+        self.progress.emit(f'Загрузка [{number}/{self.STAGES}]: {text}')
+
+    def load_ns(self, parser):
+        assert self.ns_file
+        self.stage(2, 'NSXML файл...')
+        self.cache.load_ns(parser, self.ns_file)
+
+    def load_html(self, parser):
+        assert self.ch_file
+        self.stage(3, 'HTML файл...')
+        return self.cache.prepare_html(parser, self.ch_file)
+
+    @instrumented
+    def run(self):
+        ns_parser = converter.NSParser(detach=True)
+        html_parser = converter.HTMLParser(detach=True)
+
+        msg = 'Ошибка проверки файлов!'
+        try:
+            self.stage(1, 'проверка файлов...')
+            preflight.check(self.ch_file, self.ns_file)
+
+            msg = 'Ошибка загрузки NSXML файла!'
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                ns_future = pool.submit(self.load_ns, ns_parser)
+                html_future = pool.submit(self.load_html, html_parser)
+
+                ns_future.result()
+                msg = 'Ошибка загрузки HTML файла! Отправьте лог на georgy.komarov@mail.ru'
+                key, model = html_future.result()
+
+            self.stage(4, 'разбор расписания...')
+            self.cache.parse_html(html_parser, self.ch_file, key, model, ns_parser.plans)
+
+            msg = 'Ошибка сопоставления предметов! Отправьте лог на georgy.komarov@mail.ru'
+            self.stage(5, 'сопоставление предметов...')
+            html_parser.get_subjects_set()
+            self.mapping_store.load().apply(html_parser, ns_parser)  # сохранённые соответствия прошлых недель
+            stale = self.mapping_store.get_stale(ns_parser)
+            html_parser.match_subjects(ns_parser)
+            self.stage(5, 'готово')
+        except LoadCancelled:
+            self.cancelled.emit()
+        except PreflightException as e:
+            self.failed.emit(f'Файлы не подходят друг к другу: {"; ".join(e.args)}', traceback.format_exc())
+        except BaseException:
+            self.failed.emit(msg, traceback.format_exc())
+        else:
+            self.loaded.emit(ns_parser, html_parser, stale)
+        finally:
+            self.finished.emit()
+
+
+class WeeksWorker(QtCore.QObject):
+    # Сохранение недель в отдельном потоке, окно не замирает на время конвертации
+    progress = QtCore.pyqtSignal(str)
+    week_failed = QtCore.pyqtSignal(str, str)  # HTML, traceback
+    saved = QtCore.pyqtSignal(object)  # [HTML] несохранённых недель
+    failed = QtCore.pyqtSignal(str, str)  # сообщение, traceback
+    finished = QtCore.pyqtSignal()
+
+    def __init__(self, ns_parser, ns_file, weeks, corellations, html_class):
+        super().__init__()
+        self.ns_parser = ns_parser
+        self.ns_file = ns_file
+        self.weeks = weeks  # [(HTML, NSXML для результата)]
+        self.corellations = corellations
+        self.html_class = html_class
+
+    @instrumented
+    def run(self):
+        try:
+            failed = []
+            results = weeks.export_weeks(self.ns_parser, self.ns_file, self.weeks, self.corellations,
+                                         self.html_class)
+            for number, (html, output, elapsed, unmapped, error) in enumerate(results, 1):
+                if error:
+                    failed.append(html)
+                    self.week_failed.emit(html, error)
+                self.progress.emit(f'Сохранение недель [{number}/{len(self.weeks)}]: {os.path.basename(html)}')
+        except BaseException:
+            self.failed.emit('Ошибка сохранения файла! Отправьте лог на georgy.komarov@mail.ru',
+                             traceback.format_exc())
+        else:
+            self.saved.emit(failed)
+        finally:
+            self.finished.emit()
+
+
+class CorellationsModel(QtCore.QAbstractTableModel):
+    # Соответствия предметов одного класса: урок Сетевого города -> предмет Хронографа
+    HEADERS = ('Сетевой город', 'Хронограф')
+
+    def __init__(self, ns_class, html_class, parent=None):
+        super().__init__(parent)
+        self.lessons = ns_class.plan
+        self.html_class = html_class
+
+        # Варианты выбора считаются один раз для класса и общие для всех строк
+        self.items = QtCore.QStringListModel([''] + sorted(html_class.subjects, key=self.smart_sort), self)
+
+    @staticmethod
+    def smart_sort(subject):
+        subject, teacher = subject.split(' — ')
+        subject = subject.lower()
+        if teacher[-1].isdigit():
+            digit = int(teacher[-1])
+        else:
+            digit = 0
+        return tuple([subject, digit])
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.lessons)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == 1:
+            flags |= QtCore.Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role not in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            return None
+
+        ns_lesson = self.lessons[index.row()]
+        if index.column() == 0:
+            teacher = ns_lesson.teacher.name if ns_lesson.teacher else ''
+            return f'{ns_lesson} [{teacher}]'
+        return self.html_class.corellations.get(ns_lesson, '')
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or index.column() != 1 or role != QtCore.Qt.EditRole:
+            return False
+
+        self.html_class.corellations[self.lessons[index.row()]] = value
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+
+class SubjectDelegate(QtWidgets.QStyledItemDelegate):
+    # Выпадающий список создаётся только для редактируемой ячейки
+    def createEditor(self, parent, option, index):
+        editor = QtWidgets.QComboBox(parent)
+        editor.setModel(index.model().items)
+        editor.activated.connect(lambda: self.commitData.emit(editor))
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentIndex(max(editor.findText(index.data(QtCore.Qt.EditRole)), 0))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText(), QtCore.Qt.EditRole)
 
 
 class TimeTableApp(QtWidgets.QMainWindow, design.Ui_MainWindow):
@@ -14,14 +214,29 @@ class TimeTableApp(QtWidgets.QMainWindow, design.Ui_MainWindow):
         self.actionHTML.triggered.connect(self.set_ch_file)
         self.action_NSXML.triggered.connect(self.set_ns_file)
         self.checkButton.clicked.connect(self.check)
+        self.convertButton.clicked.connect(self.save_ns_file)
+        self.saveOtherWeek.triggered.connect(self.save_other_week)
+        self.saveWeeks.triggered.connect(self.save_weeks)
         self.load.triggered.connect(self.load_data)
+        self.cancelLoad.triggered.connect(self.cancel_loading)
+        self.classchoice.currentTextChanged.connect(self.show_corellations)
+        self.corellationsView.setItemDelegateForColumn(1, SubjectDelegate(self.corellationsView))
         self.statusBar.showMessage('Загрузите файлы расписания!')
 
-        self.ns_parser = converter.NSParser()
-        self.html_parser = converter.HTMLParser()
+        self.ns_parser = None  # парсеры создаёт LoadWorker при загрузке файлов
+        self.html_parser = None
+        self.cache = cache.ModelCache()
+        self.mapping_store = mappings.MappingStore()
 
         self.ch_file = None
         self.ns_file = None
+        self.corellation_models = {}  # CorellationsModel по названию класса
+        self.export_plan = None  # собирается при проверке, сбрасывается при изменении соответствий
+
+        self.load_thread = None
+        self.load_worker = None
+        self.weeks_thread = None
+        self.weeks_worker = None
 
     def set_ch_file(self):
         self.ch_file = QtWidgets.QFileDialog.getOpenFileName(self, "Выберите файл с расписанием из Хронографа",
@@ -31,14 +246,11 @@ class TimeTableApp(QtWidgets.QMainWindow, design.Ui_MainWindow):
         self.ns_file = QtWidgets.QFileDialog.getOpenFileName(self, "Выберите файл с расписанием из Сетевого города",
                                                              filter="NSXML файлы (*.nsxml);;Все файлы (*)")[0]
 
-    def save_ns_file(self):
+    def save_ns_file(self, source=None):
         try:
             name = QtWidgets.QFileDialog.getSaveFileName(self, 'Сохранить файл',
                                                          filter="NSXML файл (*.nsxml);;Все файлы (*)")[0]
-            result = self.save_all()
-
-            with open(name, 'w', encoding='windows-1251') as f:
-                f.write(result)
+            self.save_all(name, source)
 
             self.statusBar.showMessage('Файл сохранён!')
         except BaseException as e:
@@ -49,86 +261,159 @@ class TimeTableApp(QtWidgets.QMainWindow, design.Ui_MainWindow):
                 log.write(msg + '\n\n' + error)
             self.statusBar.showMessage(msg)
 
+    def save_other_week(self):  # те же соответствия, блок <Week> записывается в файл Сетевого города другой недели
+        source = QtWidgets.QFileDialog.getOpenFileName(self, "Выберите файл Сетевого города другой недели",
+                                                       filter="NSXML файлы (*.nsxml);;Все файлы (*)")[0]
+        if source:
+            self.save_ns_file(source)
+
+    def save_weeks(self):  # те же соответствия для выгрузок Хронографа других недель, по NSXML на неделю
+        if self.weeks_thread is not None:  # сохранение уже идёт
+            return
+        files = QtWidgets.QFileDialog.getOpenFileNames(self, "Выберите расписания Хронографа других недель",
+                                                       filter="HTML файлы (*.html);;Все файлы (*)")[0]
+        if not files:
+            return
+        directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Выберите каталог для файлов Сетевого города")
+        if not directory:
+            return
+
+        self.weeks_thread = QtCore.QThread()
+        self.weeks_worker = WeeksWorker(self.ns_parser, self.ns_file, weeks.get_outputs(files, directory, self.ns_file),
+                                        self.html_parser.get_corellations(), type(self.html_parser))
+        self.weeks_worker.moveToThread(self.weeks_thread)
+
+        self.weeks_thread.started.connect(self.weeks_worker.run)
+        self.weeks_worker.progress.connect(self.statusBar.showMessage)
+        self.weeks_worker.week_failed.connect(self.on_week_failed)
+        self.weeks_worker.saved.connect(self.on_weeks_saved)
+        self.weeks_worker.failed.connect(self.on_load_failed)
+        self.weeks_worker.finished.connect(self.weeks_thread.quit)
+        self.weeks_thread.finished.connect(self.on_weeks_finished)
+
+        self.saveWeeks.setEnabled(False)
+        self.statusBar.showMessage('Сохранение недель...')
+        self.weeks_thread.start()
+
+    def on_week_failed(self, html, error):
+        with open('error.log', 'a') as log:
+            log.write(f'Ошибка сохранения недели {html}\n\n{error}')
+
+    def on_weeks_saved(self, failed):
+        if failed:
+            self.statusBar.showMessage(f'Не сохранены: {", ".join(map(os.path.basename, failed))}. '
+                                       f'Подробности в error.log')
+        else:
+            self.statusBar.showMessage(f'Сохранено недель: {len(self.weeks_worker.weeks)}')
+
+    def on_weeks_finished(self):
+        self.weeks_thread.deleteLater()
+        self.weeks_worker.deleteLater()
+        self.weeks_thread = None
+        self.weeks_worker = None
+        self.saveWeeks.setEnabled(True)
+
     def load_data(self):
-        try:
-            assert self.ch_file
-            self.html_parser.load(self.ch_file)
-        except BaseException as e:
-            msg = 'Ошибка загрузки HTML файла! Отправьте лог на georgy.komarov@mail.ru'
-            error = traceback.format_exc()
+        if self.load_thread is not None:  # загрузка уже идёт
+            return
+
+        self.load_thread = QtCore.QThread()
+        self.load_worker = LoadWorker(self.ch_file, self.ns_file, self.cache, self.mapping_store)
+        self.load_worker.moveToThread(self.load_thread)
+
+        self.load_thread.started.connect(self.load_worker.run)
+        self.load_worker.progress.connect(self.statusBar.showMessage)
+        self.load_worker.loaded.connect(self.on_loaded)
+        self.load_worker.failed.connect(self.on_load_failed)
+        self.load_worker.cancelled.connect(self.on_load_cancelled)
+        self.load_worker.finished.connect(self.load_thread.quit)
+        self.load_thread.finished.connect(self.on_load_finished)
+
+        self.load.setEnabled(False)
+        self.cancelLoad.setEnabled(True)
+        self.load_thread.start()
+
+    def cancel_loading(self):
+        if self.load_worker is not None:
+            self.load_worker.stop()
+            self.statusBar.showMessage('Отмена загрузки...')
+
+    def on_loaded(self, ns_parser, html_parser, stale):
+        self.ns_parser, self.html_parser = ns_parser, html_parser
+        self.corellation_models = {}
+        self.reset_export_plan()
+        self.fill_combobox()
+        self.checkButton.setEnabled(True)
+        if stale:  # уроки плана NS поменяли id, такие соответствия нужно выбрать заново
+            self.statusBar.showMessage(f'Файлы успешно загружены! Устаревших соответствий: {len(stale)} '
+                                       f'({", ".join(sorted({class_name for class_name, _, _ in stale}))})')
+        else:
+            self.statusBar.showMessage('Файлы успешно загружены!')
 
-            with open('error.log', 'a') as log:
-                log.write(msg + '\n\n' + error)
-            self.statusBar.showMessage(msg)
+    def on_load_failed(self, msg, error):
+        with open('error.log', 'a') as log:
+            log.write(msg + '\n\n' + error)
+        self.statusBar.showMessage(msg)
+
+    def on_load_cancelled(self):
+        self.statusBar.showMessage('Загрузка отменена')
+
+    def on_load_finished(self):
+        self.load_thread.deleteLater()
+        self.load_worker.deleteLater()
+        self.load_thread = None
+        self.load_worker = None
 
-        if self.html_parser.table:
-            try:
-                assert self.ns_file
-                self.ns_parser.load(self.ns_file)
-                self.ns_parser.parse_all()
-            except:
-                msg = 'Ошибка загрузки NSXML файла!'
-                error = traceback.format_exc()
-
-                with open('error.log', 'a') as log:
-                    log.write(msg + '\n\n' + error)
-                self.statusBar.showMessage(msg)
-            else:
-                self.html_parser.set_classes(self.ns_parser.plans)
-                self.html_parser.parse()
-                self.html_parser.get_subjects_set()
-                self.fill_combobox()
-                self.checkButton.setEnabled(True)
-                self.statusBar.showMessage('Файлы успешно загружены!')
+        self.load.setEnabled(True)
+        self.cancelLoad.setEnabled(False)
 
     def fill_combobox(self):
+        self.classchoice.blockSignals(True)  # при повторной загрузке убираем старые классы
+        self.classchoice.clear()
         self.classchoice.addItems([c.name for c in self.ns_parser.plans])
+        self.classchoice.blockSignals(False)
         self.classchoice.setEnabled(True)
-        self.classchoice.currentTextChanged.connect(self.show_corellations)
         self.show_corellations(self.ns_parser.plans[0].name)
 
     def show_corellations(self, name):  # name - номер+буква класса
-        self.clear_layout(self.scrollbarLayout)
-
-        html_class = self.html_parser.get_class_by_name(name)
-        ns_class = self.ns_parser.get_class_by_name(name)
-
-        for i, ns_lesson in enumerate(ns_class.plan, start=1):
-            items = self.fill_subjects_combobox(ns_lesson, html_class)
+        model = self.corellation_models.get(name)
+        if model is None:
+            ns_class = self.ns_parser.get_class_by_name(name)
+            html_class = self.html_parser.get_class_by_name(name)
+            model = self.corellation_models[name] = CorellationsModel(ns_class, html_class, self)
+            model.dataChanged.connect(self.reset_export_plan)
 
-            horizontalLayout = QtWidgets.QHBoxLayout()
-            horizontalLayout.setObjectName(f"horizontalLayout_{i}")
-
-            subject = QtWidgets.QLabel(self.scrollAreaWidgetContents)
-            subject.setObjectName(f"subject_{i}")
-            subject.setText(f'{ns_lesson} [{ns_lesson.teacher.name}]')
-            horizontalLayout.addWidget(subject)
-
-            subject_comboBox = QtWidgets.QComboBox(self.scrollAreaWidgetContents)
-            subject_comboBox.setObjectName(f"subject_comboBox_{i}")
-            subject_comboBox.addItems(items)
-            subject_comboBox.currentTextChanged.connect(self.save_corellations)
-            horizontalLayout.addWidget(subject_comboBox)
-
-            self.scrollbarLayout.addLayout(horizontalLayout)
+        self.corellationsView.setModel(model)
+        self.corellationsView.resizeColumnToContents(0)
 
     def check(self):
         try:
-            not_completed = []
-            classes = self.html_parser.classes
-            for c in classes:
-                corellations, subjects = c.corellations, c.subjects
-                if len(corellations) != len(subjects):
-                    not_completed.append(c.name)
-            if not_completed:
+            self.export_plan = self.html_parser.compile()
+            not_completed = [f'{name} ({count})' for name, count in self.export_plan.get_unmapped().items() if count]
+            found = conflicts.find_conflicts(self.html_parser)
+            if not_completed or found:
+                text = []
+                details = []
+                if not_completed:
+                    text.append(f'В классах {", ".join(not_completed)} заполнены не все предметы! '
+                                f'(в скобках - количество уроков без соответствия)')
+                    details += [f'{name}: сопоставлено {coverage["mapped"]} из {coverage["lessons"]} уроков, '
+                                f'нет соответствия: {", ".join(coverage["unmapped"])}'
+                                for name, coverage in self.export_plan.coverage.items() if coverage['unmapped']]
+                if found:
+                    text.append(f'В расписании {len(found)} накладок учителей и кабинетов!')
+                    details += map(str, found)
+
                 msg = QtWidgets.QMessageBox()
                 msg.setIcon(QtWidgets.QMessageBox.Warning)
                 msg.setText("Внимание!")
-                msg.setInformativeText(f'В классах {", ".join(not_completed)} заполнены не все предметы!')
+                msg.setInformativeText('\n'.join(text))
+                msg.setDetailedText('\n'.join(details))
                 msg.exec_()
 
             self.convertButton.setEnabled(True)
-            self.convertButton.clicked.connect(self.save_ns_file)
+            self.saveOtherWeek.setEnabled(True)
+            self.saveWeeks.setEnabled(True)
         except BaseException as e:
             msg = 'Что-то пошло не так...'
             error = traceback.format_exc()
@@ -137,96 +422,19 @@ class TimeTableApp(QtWidgets.QMainWindow, design.Ui_MainWindow):
                 log.write(msg + '\n\n' + error)
             self.statusBar.showMessage(msg)
 
-    def clear_layout(self, layout):
-        while layout.count():
-            child = layout.takeAt(0)
-            if child.widget() is not None:
-                child.widget().deleteLater()
-            elif child.layout() is not None:
-                self.clear_layout(child.layout())
-
-    def fill_subjects_combobox(self, ns_lesson, html_class):
-        def smart_sort(subject):
-            subject, teacher = subject.split(' — ')
-            subject = subject.lower()
-            if teacher[-1].isdigit():
-                digit = int(teacher[-1])
-            else:
-                digit = 0
-            return tuple([subject, digit])
-
-        html_subjects = list(html_class.subjects)
-        for subject in html_subjects:
-            name, teacher = subject.split(' — ')
-            if name.lower() == ns_lesson.name.lower() and teacher == ns_lesson.teacher.name or \
-                    html_class.corellations.get(ns_lesson) == subject:  # учитываем сохраненное значение
-                valid_subject = subject
-                html_subjects.remove(subject)
-                break
-        else:
-            valid_subject = None
-
-        result = [''] + sorted(list(html_subjects), key=smart_sort)
-        if valid_subject:
-            result.insert(0, valid_subject)
-            html_class.corellations[ns_lesson] = valid_subject
-        return result
-
-    def save_corellations(self, html_name):
-        sender = self.sender()
-        index = sender.objectName().split('_')[-1]
-
-        class_name = str(self.classchoice.currentText())
-        subject_label = self.findChild(QtWidgets.QLabel, f'subject_{index}').text()
-        subject_name, teacher_name = subject_label.split(' [')
-
-        ns_lesson = self.ns_parser.get_lesson_by_subject_name(subject_name, class_name)
-        html_class = self.html_parser.get_class_by_name(class_name)
-        html_class.corellations[
-            ns_lesson] = html_name
-
-    def save_all(self):
-        timetable = []
-
-        for day in self.ns_parser.DAYS:
-            timetable.append([])
-            for i in range(self.html_parser.LAST_LESSON_NUMBER):
-                timetable[day.id].append([])
-
-        for class_ in self.html_parser.classes:
-            reversed_corellations = {v: k for k, v in
-                                     class_.corellations.items()}  # Переворачиваем словарь для текущего класса
-            for lesson in class_.lessons:  # HTMLLesson День[№ урока] - Предмет (учитель)
-                try:
-                    day_num_lessons = timetable[lesson.day.id][lesson.number]  # Список уроков (день, номер)
-                    day_num_lessons.append(reversed_corellations[lesson.get_subject()].id)
-                except KeyError as e:
-                    pass
-
-        timetable_result = ''
-        for day in self.ns_parser.DAYS:  # TODO: Save to file directly
-            timetable_result += f'<Day id="{day.id + 1}" name="{day.name}" wd="{day.id + 2}" >\n'
-            for lesson_number, lessons in enumerate(timetable[day.id], start=1):
-                timetable_result += f'\t<Lesson timeId="{lesson_number}">\n'
-                for lesson_id in lessons:
-                    timetable_result += '\t\t' + f'<csg id="{lesson_id}"/>\n'
-                timetable_result += '\t</Lesson>\n'
-            timetable_result += '</Day>\n'
-
-        with open(self.ns_file, encoding='windows-1251') as f:
-            ns_file = f.readlines()
-
-        week_block_start = None
-        week_block_end = None
-
-        for i, j in enumerate(ns_file):
-            if week_block_start is None and j.strip().lower().startswith('<week'):
-                week_block_start = i
-            elif week_block_end is None and j.strip().lower().startswith('</week>'):
-                week_block_end = i
-
-        result = ''.join(ns_file[:week_block_start + 1]) + timetable_result + ''.join(ns_file[week_block_end:])
-        return result
+    def reset_export_plan(self):
+        self.export_plan = None
+
+    @instrumented
+    def save_all(self, filename, source=None):
+        if self.export_plan is None:  # соответствия менялись после проверки
+            self.export_plan = self.html_parser.compile()
+        writer = converter.NSWriter.from_plan(self.export_plan)
+        writer.write(source or self.ns_file, filename)
+
+        # проверенные соответствия пригодятся на следующей неделе
+        self.mapping_store.update(self.html_parser, self.ns_parser)
+        self.mapping_store.save()
 
 
 def main():
@@ -0,0 +1,155 @@
+import cProfile
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Замеры этапов конвертации: время, пик памяти и количество классов/уроков/групп.
+# Включается переменной окружения CHNGF_STATS=путь (или configure из CLI), записи - JSON по строке на этап.
+# tracemalloc считает память всего процесса, поэтому у этапов, шедших одновременно с этапами других потоков
+# (загрузка NSXML и HTML в GUI), пик не записывается: "peak": null и "concurrent": true.
+STATS_VARIABLE = 'CHNGF_STATS'
+
+
+class Instrumentation:
+    def __init__(self):
+        self.stats_file = None
+        self.memory = True  # замерять пик памяти (tracemalloc заметно замедляет разбор)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.active = {}  # поток -> стек этапов с замером памяти, меняется под lock
+
+    @property
+    def enabled(self):
+        return self.stats_file is not None
+
+    def configure(self, stats_file=None, memory=True):
+        self.stats_file = stats_file
+        self.memory = memory
+        if stats_file and memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def get_stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def stage(self, name, counter=None):
+        if not self.enabled:
+            yield
+            return
+        if not self.memory:
+            yield from self.time_stage(name, counter)
+            return
+
+        # Вложенные этапы сбрасывают пик, поэтому внешний этап хранит максимум, замеченный до сброса.
+        # Элемент стека - [память в начале, пик, шёл одновременно с этапом другого потока]
+        stack = self.get_stack()
+        entry = [0, 0, False]
+        with self.lock:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            entry[:2] = current, current
+
+            others = [other for thread, other in self.active.items() if thread != threading.get_ident() and other]
+            if others:  # пик общий для процесса: сброс испортил замер этапов других потоков, а они - наш
+                entry[2] = True
+                for other in others:
+                    for other_entry in other:
+                        other_entry[2] = True
+            stack.append(entry)
+            self.active[threading.get_ident()] = stack
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            with self.lock:
+                allocated, seen, concurrent = stack.pop()
+                peak = max(seen, tracemalloc.get_traced_memory()[1])
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], peak)
+                else:
+                    del self.active[threading.get_ident()]
+
+            record = {
+                'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+                'pid': os.getpid(),
+                'stage': name,
+                'wall': round(wall, 6),
+                'peak': None if concurrent else peak - allocated,
+            }
+            if concurrent:
+                record['concurrent'] = True
+            if failed:
+                record['failed'] = True
+            elif counter is not None:
+                record.update(counter())
+            self.write(record)
+
+    def time_stage(self, name, counter):  # этап без замера памяти
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            record = {
+                'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+                'pid': os.getpid(),
+                'stage': name,
+                'wall': round(time.perf_counter() - start, 6),
+            }
+            if failed:
+                record['failed'] = True
+            elif counter is not None:
+                record.update(counter())
+            self.write(record)
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock, open(self.stats_file, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+recorder = Instrumentation()
+recorder.configure(os.environ.get(STATS_VARIABLE))
+
+
+def instrumented(func):
+    # Этап называется по классу и методу: NSIterParser.load, HTMLParser.parse и т.д.
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not recorder.enabled:
+            return func(self, *args, **kwargs)
+        with recorder.stage(f'{type(self).__name__}.{func.__name__}', getattr(self, 'get_counts', None)):
+            return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def profile(filename):  # cProfile всей конвертации, результат смотреть через pstats или snakeviz
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(filename)
@@ -0,0 +1,120 @@
+import json
+import os
+import time
+
+import cache
+
+# Сохранённые соответствия предметов между запусками. Запись - (id класса NS, id урока NS, нормализованный предмет
+# Хронографа) -> (класс, предмет как в Хронографе, время последнего сохранения). id классов и уроков NS уникальны
+# в пределах сервера Сетевого города, поэтому записи разных школ в одном файле не смешиваются. При загрузке записи
+# ищутся по индексу (id класса, нормализованный предмет) для предметов текущей выгрузки, поэтому вся школа
+# сопоставляется за один проход. Записи классов плана NS, чьих уроков в плане больше нет, считаются устаревшими
+# и удаляются при следующем update.
+DEFAULT_FILENAME = os.path.join(cache.DEFAULT_DIRECTORY, 'mappings.json')
+VERSION = 2
+
+
+def is_store(data):  # JSON файла MappingStore, а не соответствий {класс: {id урока NS: предмет}}
+    return isinstance(data, dict) and 'version' in data and 'entries' in data
+
+
+def normalize_subject(subject):  # регистр, "ё" и лишние пробелы не различаются
+    return ' '.join(subject.replace('ё', 'е').replace('Ё', 'Е').casefold().split())
+
+
+class MappingStore:
+    def __init__(self, filename=DEFAULT_FILENAME):
+        self.filename = filename
+        self.entries = {}  # (id класса NS, id урока NS, нормализованный предмет) -> (класс, предмет, время)
+        self.index = None  # (id класса NS, нормализованный предмет) -> [id урока NS]
+
+    def load(self):
+        try:
+            with open(self.filename, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):  # нет файла или он повреждён - начинаем заново
+            data = {}
+        if data.get('version') != VERSION:  # в записях версии 1 не было id класса, их школа неизвестна
+            data = {}
+
+        self.entries = {(class_id, lesson_id, normalize_subject(subject)): (class_name, subject, used)
+                        for class_id, class_name, lesson_id, subject, used in data.get('entries', [])}
+        self.index = None
+        return self
+
+    def save(self):
+        data = {'version': VERSION,
+                'entries': [[class_id, class_name, lesson_id, subject, used]
+                            for (class_id, lesson_id, _), (class_name, subject, used) in sorted(self.entries.items())]}
+        os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        with open(self.filename + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=0)
+        os.replace(self.filename + '.tmp', self.filename)
+
+    def get_index(self):
+        if self.index is None:
+            self.index = {}
+            for class_id, lesson_id, normalized in self.entries:
+                self.index.setdefault((class_id, normalized), []).append(lesson_id)
+        return self.index
+
+    @staticmethod
+    def get_subjects(class_):  # предметы класса Хронографа, get_subjects_set мог ещё не вызываться
+        return class_.subjects or {lesson.get_subject() for lesson in class_.lessons}
+
+    def apply(self, html_parser, ns_parser):  # заполняет несопоставленные уроки NS, возвращает их количество
+        index = self.get_index()
+        applied = 0
+        for class_ in html_parser.classes:
+            ns_class = ns_parser.plans_by_name.get(class_.name)
+            if ns_class is None:
+                continue
+
+            found = {}  # урок NS -> (время, предмет), при нескольких предметах берётся последний сохранённый
+            for subject in self.get_subjects(class_):
+                normalized = normalize_subject(subject)
+                for lesson_id in index.get((ns_class.id, normalized), ()):
+                    ns_lesson = ns_class.lessons_by_id.get(lesson_id)
+                    if ns_lesson is None or ns_lesson in class_.corellations:
+                        continue
+                    used = self.entries[ns_class.id, lesson_id, normalized][2]
+                    if ns_lesson not in found or found[ns_lesson][0] < used:
+                        found[ns_lesson] = used, subject
+
+            for ns_lesson, (_, subject) in found.items():
+                class_.corellations[ns_lesson] = subject
+            applied += len(found)
+        return applied
+
+    def get_stale(self, ns_parser):  # [(класс, id урока NS, предмет)] уроков классов этой школы, которых нет в плане
+        classes = {ns_class.id: ns_class for ns_class in ns_parser.plans}
+        stale = []
+        for (class_id, lesson_id, _), (class_name, subject, _) in self.entries.items():
+            ns_class = classes.get(class_id)
+            if ns_class is not None and lesson_id not in ns_class.lessons_by_id:
+                stale.append((class_name, lesson_id, subject))
+        return sorted(stale)
+
+    def update(self, html_parser, ns_parser):
+        # Запоминает текущие соответствия школы, снятые пользователем и устаревшие записи её классов удаляются
+        index = self.get_index()
+        now = int(time.time())
+        classes = {ns_class.id: ns_class for ns_class in ns_parser.plans}
+        for key in [key for key in self.entries if key[0] in classes and key[1] not in classes[key[0]].lessons_by_id]:
+            del self.entries[key]
+
+        for class_ in html_parser.classes:
+            ns_class = ns_parser.plans_by_name.get(class_.name)
+            if ns_class is None:
+                continue
+            current = {ns_lesson.id: subject for ns_lesson, subject in class_.corellations.items()}
+            for subject in self.get_subjects(class_):
+                normalized = normalize_subject(subject)
+                for lesson_id in index.get((ns_class.id, normalized), ()):
+                    if current.get(lesson_id) != subject:
+                        self.entries.pop((ns_class.id, lesson_id, normalized), None)
+
+            for lesson_id, subject in current.items():
+                if subject:
+                    self.entries[ns_class.id, lesson_id, normalize_subject(subject)] = class_.name, subject, now
+        self.index = None
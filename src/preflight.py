@@ -0,0 +1,151 @@
+import argparse
+import html
+import mmap
+import re
+import sys
+import time
+
+from exceptions import PreflightException
+from sources import SNIFF_SIZE, detect_encoding
+
+# Быстрая проверка файлов до полного разбора: из HTML берутся только шапка таблицы и ячейки дней недели,
+# из NSXML - список классов блока Plan (файл читается до </Plan>). Классы Хронографа сопоставляются
+# с классами Сетевого города по номеру столбца: расхождение в количестве - ошибка, в названиях - предупреждение.
+HEADER_ROW = 2  # строка таблицы с названиями классов
+HEADER_CELLS = 3  # пустая ячейка, "№" и "Время" перед классами
+
+TABLE_START = re.compile(rb'<table\b', re.IGNORECASE)
+TABLE_END = re.compile(rb'</table\s*>', re.IGNORECASE)
+ROW = re.compile(rb'<tr\b', re.IGNORECASE)
+DAY_CELL = re.compile(rb'<td\b[^>]*style\s*=\s*["\']?;text-align:left\b[^>]*>', re.IGNORECASE)  # Блок с днем недели
+ROWSPAN = re.compile(rb'rowspan\s*=\s*["\']?(\d+)', re.IGNORECASE)
+CELL = re.compile(r'<td\b[^>]*>(.*?)(?=<td\b|</tr|$)', re.IGNORECASE | re.DOTALL)
+TAG = re.compile(r'<[^>]*>')
+
+PLAN_END = re.compile(rb'</plan\s*>', re.IGNORECASE)
+CLASS = re.compile(rb'<class\b([^>]*)>', re.IGNORECASE)
+ATTRIBUTE = re.compile(rb'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+def normalize_class(name):  # '5 А' и '5а' - один класс
+    return name.casefold().replace('ё', 'е').replace(' ', '')
+
+
+def read_until(filename, pattern):  # начало файла до pattern включительно (или весь файл)
+    with open(filename, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # пустой файл
+            return b''
+        with data:
+            match = pattern.search(data)
+            return data[:match.end() if match else len(data)]
+
+
+def scan_html(filename):  # (классы из шапки, уроков по дням, строк с уроками)
+    data = read_until(filename, TABLE_END)
+    table = TABLE_START.search(data)
+    if table is None:
+        raise PreflightException(f'В файле {filename} нет таблицы расписания')
+
+    rows = [match.start() for match in ROW.finditer(data, table.start())]
+    if len(rows) <= HEADER_ROW:
+        raise PreflightException(f'В файле {filename} нет шапки с названиями классов')
+
+    header = data[rows[HEADER_ROW]:rows[HEADER_ROW + 1] if len(rows) > HEADER_ROW + 1 else len(data)]
+    header = header.decode(detect_encoding(data[:SNIFF_SIZE]), 'replace')
+    cells = [html.unescape(TAG.sub('', cell)).strip() for cell in CELL.findall(header)]
+
+    days = []
+    for cell in DAY_CELL.finditer(data, table.start()):
+        rowspan = ROWSPAN.search(cell.group())
+        if rowspan:
+            days.append(int(rowspan.group(1)))
+
+    return cells[HEADER_CELLS:], days, len(rows) - HEADER_ROW - 1
+
+
+def scan_nsxml(filename):  # названия классов блока Plan
+    classes = []
+    data = read_until(filename, PLAN_END)
+    encoding = detect_encoding(data[:SNIFF_SIZE])
+    for match in CLASS.finditer(data):
+        attrs = {key.lower(): double if double or not single else single
+                 for key, double, single in ATTRIBUTE.findall(match.group(1))}
+        classes.append(attrs.get(b'name', b'').decode(encoding, 'replace'))
+    return classes
+
+
+class Preflight:
+    DAYS_LIMIT = 6
+
+    def __init__(self, html_filename, ns_filename):
+        start = time.perf_counter()
+        self.html_classes, self.days, self.rows_number = scan_html(html_filename)
+        self.ns_classes = scan_nsxml(ns_filename)
+        self.elapsed = time.perf_counter() - start
+
+        self.lessons_number = self.days[0] if self.days else 0
+        self.days_number = len(self.days)
+
+        self.errors = []
+        self.warnings = []
+        self.validate()
+
+    def validate(self):
+        if not self.days:
+            self.errors.append('в таблице Хронографа не найдены дни недели')
+        elif len(set(self.days)) > 1:
+            self.errors.append(f'разное количество уроков в днях: {", ".join(map(str, self.days))}')
+        elif self.days_number > self.DAYS_LIMIT:
+            self.errors.append(f'дней недели больше {self.DAYS_LIMIT}: {self.days_number}')
+        elif self.rows_number != self.lessons_number * self.days_number:
+            self.errors.append(f'строк с уроками {self.rows_number}, ожидалось {self.days_number} дней '
+                               f'по {self.lessons_number} уроков')
+
+        if not self.ns_classes:
+            self.errors.append('в файле Сетевого города нет классов (блок Plan)')
+        if len(self.html_classes) != len(self.ns_classes):
+            self.errors.append(f'количество классов не совпадает: в Хронографе {len(self.html_classes)}, '
+                               f'в Сетевом городе {len(self.ns_classes)}')
+
+        for column, (html_class, ns_class) in enumerate(zip(self.html_classes, self.ns_classes), start=1):
+            if normalize_class(html_class) != normalize_class(ns_class):
+                self.warnings.append(f'столбец {column}: {html_class} в Хронографе, {ns_class} в Сетевом городе')
+
+    def check(self):
+        if self.errors:
+            raise PreflightException(*self.errors)
+        return self
+
+    def __str__(self):
+        lines = [f'Хронограф: классов {len(self.html_classes)}, дней {self.days_number}, '
+                 f'уроков в день {self.lessons_number}',
+                 f'Сетевой город: классов {len(self.ns_classes)}']
+        lines += [f'Ошибка: {error}' for error in self.errors]
+        lines += [f'Предупреждение: {warning}' for warning in self.warnings]
+        lines.append(f'Проверено за {self.elapsed * 1000:.1f} мс')
+        return '\n'.join(lines)
+
+
+def check(html_filename, ns_filename):
+    return Preflight(html_filename, ns_filename).check()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Проверка файлов Хронографа и Сетевого города до конвертации')
+    parser.add_argument('html')
+    parser.add_argument('nsxml')
+    args = parser.parse_args(argv)
+
+    try:
+        report = Preflight(args.html, args.nsxml)
+    except PreflightException as e:
+        print(f'Ошибка: {e}', file=sys.stderr)
+        return 1
+    print(report)
+    return 1 if report.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
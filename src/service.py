@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import email.parser
+import email.policy
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import cli
+import converter
+
+# HTTP-сервис конвертации для районного центра (только стандартная библиотека).
+#   POST /jobs               - multipart/form-data с полями html, nsxml и mapping (mapping необязателен),
+#                              ответ 202 {"id": ...}; задание ждёт в очереди свободный процесс пула
+#   GET  /jobs               - список заданий
+#   GET  /jobs/<id>          - состояние задания, ожидание в очереди и время этапов конвертации
+#   GET  /jobs/<id>/result   - дожидается конца задания и отдаёт NSXML частями (chunked)
+# Каждое соединение обслуживает один запрос. Задание выполняется как в cli.py, время этапов (без замера памяти)
+# пишется в каталог задания. Завершённые задания и их файлы удаляются через retention секунд.
+# Процессы пула запускаются через forkserver (в Windows - spawn): при fork они унаследовали бы слушающий сокет
+# и держали порт после остановки сервиса.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_QUEUE = 100
+DEFAULT_RETENTION = 3600  # с
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+MAX_BODY = 64 * 1024 * 1024
+MAX_HEADERS = 100
+CHUNK_SIZE = 64 * 1024
+FIELDS = {'html': 'school.html', 'nsxml': 'school.nsxml', 'mapping': 'mapping.json'}
+RESULT = 'result.nsxml'
+STAGES = 'stages.jsonl'
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 422: 'Unprocessable Entity', 503: 'Service Unavailable'}
+
+
+def init_worker():  # процесс пула завершается вместе с сервисом, даже если тот был убит без очистки
+    parent = multiprocessing.parent_process()
+    threading.Thread(target=exit_with, args=(parent,), daemon=True).start()
+
+
+def exit_with(process):
+    process.join()
+    os._exit(1)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    def __init__(self, directory):
+        self.id = uuid.uuid4().hex
+        self.directory = directory
+        self.state = QUEUED
+        self.error = None
+        self.created = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self.done = asyncio.Event()
+        self.task = None  # asyncio.Task выполнения, ссылка не даёт сборщику мусора удалить задачу
+
+    def get_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get_stages(self):  # [{"stage", "wall", ...}] из лога instrumentation процесса пула
+        try:
+            with open(self.get_path(STAGES), encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+        except FileNotFoundError:
+            return []
+        return [{key: value for key, value in record.items() if key not in ('time', 'pid')} for record in records]
+
+    def get_status(self):
+        now = time.perf_counter()
+        status = {'id': self.id, 'state': self.state,
+                  'queued': round((self.started or now) - self.created, 6)}
+        if self.started is not None:
+            status['elapsed'] = round((self.finished or now) - self.started, 6)
+            status['stages'] = self.get_stages()
+        if self.error:
+            status['error'] = self.error
+        return status
+
+
+class Service:
+    def __init__(self, directory, workers=None, queue=DEFAULT_QUEUE, options=None, retention=DEFAULT_RETENTION):
+        self.directory = directory
+        self.workers = workers or os.cpu_count()
+        self.queue = queue  # заданий в очереди и в работе, сверх - 503
+        self.retention = retention  # с, сколько хранить завершённое задание
+        self.options = options or {}
+        self.jobs = {}
+        self.pool = None
+        self.slots = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(START_METHOD),
+                                        initializer=init_worker)
+        self.slots = asyncio.Semaphore(self.workers)  # задание "в работе", только когда процесс свободен
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None  # очереди пула удаляются до выхода, resource_tracker не видит утёкших семафоров
+
+    def get_active(self):
+        return sum(1 for job in self.jobs.values() if job.state in (QUEUED, RUNNING))
+
+    def submit(self, files):
+        if self.get_active() >= self.queue:
+            raise HTTPError(503, 'Очередь заданий заполнена')
+        missing = [field for field in ('html', 'nsxml') if field not in files]
+        if missing:
+            raise HTTPError(400, f'Не переданы поля {", ".join(missing)}')
+
+        job = Job(tempfile.mkdtemp(prefix='job-', dir=self.directory))
+        for field, filename in FIELDS.items():
+            if field in files:  # без mapping предметы сопоставляются автоматически, как в cli.py
+                with open(job.get_path(filename), 'wb') as f:
+                    f.write(files[field])
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self.run(job))
+        return job
+
+    async def run(self, job):
+        async with self.slots:
+            job.state = RUNNING
+            job.started = time.perf_counter()
+            task = {key: job.get_path(filename) for key, filename in FIELDS.items()
+                    if os.path.exists(job.get_path(filename))}
+            task['output'] = job.get_path(RESULT)
+            try:
+                _, job.error, _ = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, cli.run_job, task, self.options, job.get_path(STAGES), None, False)
+            except BaseException as e:  # процесс пула упал целиком
+                job.error = repr(e)
+            job.finished = time.perf_counter()
+            job.state = FAILED if job.error else DONE
+            job.done.set()
+        asyncio.get_running_loop().call_later(self.retention, self.remove, job)
+
+    def remove(self, job):  # результат, который уже отдаётся клиенту, дочитывается из открытого файла
+        self.jobs.pop(job.id, None)
+        shutil.rmtree(job.directory, ignore_errors=True)
+
+    def get_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPError(404, f'Нет задания {job_id}')
+        return job
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, headers, body = await read_request(reader)
+            await self.route(writer, method, path, headers, body)
+        except HTTPError as e:
+            await send_json(writer, e.status, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, writer, method, path, headers, body):
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        if parts == ['jobs'] and method == 'POST':
+            job = self.submit(parse_form(headers.get('content-type', ''), body))
+            await send_json(writer, 202, job.get_status(), {'Location': f'/jobs/{job.id}'})
+        elif parts == ['jobs'] and method == 'GET':
+            await send_json(writer, 200, [job.get_status() for job in self.jobs.values()])
+        elif len(parts) == 2 and parts[0] == 'jobs' and method == 'GET':
+            await send_json(writer, 200, self.get_job(parts[1]).get_status())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result' and method == 'GET':
+            job = self.get_job(parts[1])
+            await job.done.wait()
+            if job.state == FAILED:
+                raise HTTPError(422, job.error)
+            await send_file(writer, job.get_path(RESULT))
+        elif parts[:1] == ['jobs']:
+            raise HTTPError(405, f'Метод {method} не поддерживается')
+        else:
+            raise HTTPError(404, f'Нет ресурса {path}')
+
+
+async def read_request(reader):  # (метод, путь, заголовки в нижнем регистре, тело)
+    try:
+        method, path, _ = (await reader.readline()).decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, 'Некорректная строка запроса')
+
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HTTPError(400, 'Слишком много заголовков')
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, 'Некорректный Content-Length')
+    if length > MAX_BODY:
+        raise HTTPError(413, f'Запрос больше {MAX_BODY} байт')
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), path, headers, body
+
+
+def parse_form(content_type, body):  # {поле: bytes} из multipart/form-data
+    if not content_type.startswith('multipart/form-data'):
+        raise HTTPError(400, 'Ожидается multipart/form-data')
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode('latin-1') + body)
+    if not message.is_multipart():
+        raise HTTPError(400, 'Некорректное тело multipart/form-data')
+    return {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+            for part in message.iter_parts()}
+
+
+async def send_headers(writer, status, headers):
+    lines = [f'HTTP/1.1 {status} {REASONS[status]}', 'Connection: close']
+    lines += [f'{name}: {value}' for name, value in headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+    await writer.drain()
+
+
+async def send_json(writer, status, data, headers=None):
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    await send_headers(writer, status, {'Content-Type': 'application/json; charset=utf-8',
+                                        'Content-Length': len(body), **(headers or {})})
+    writer.write(body)
+    await writer.drain()
+
+
+async def send_file(writer, filename):  # NSXML частями, не читая файл целиком
+    await send_headers(writer, 200, {'Content-Type': 'application/xml', 'Transfer-Encoding': 'chunked',
+                                     'Content-Disposition': 'attachment; filename="result.nsxml"'})
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            await writer.drain()
+    writer.write(b'0\r\n\r\n')
+    await writer.drain()
+
+
+async def serve(service, host, port):
+    server = await service.start(host, port)
+    print(f'Сервис конвертации: http://{host}:{port}/jobs, процессов {service.workers}')
+    stopped = asyncio.get_running_loop().create_future()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set_result, None)  # как Ctrl+C
+    except NotImplementedError:  # Windows
+        pass
+    async with server:
+        await stopped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='HTTP-сервис конвертации расписаний Хронографа в NSXML')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='количество процессов')
+    parser.add_argument('-q', '--queue', type=int, default=DEFAULT_QUEUE, help='максимум заданий в очереди')
+    parser.add_argument('-d', '--directory', help='каталог для файлов заданий (по умолчанию - временный)')
+    parser.add_argument('-r', '--retention', type=float, default=DEFAULT_RETENTION,
+                        help='сколько хранить завершённое задание, с')
+    parser.add_argument('--ns-engine', choices=converter.NS_PARSERS, default='iterparse')
+    parser.add_argument('--html-engine', choices=converter.HTML_PARSERS, default='xpath')
+    parser.add_argument('--match', action='store_true',
+                        help='автоматически сопоставить предметы, не указанные в mapping')
+    parser.add_argument('--conflicts', action='store_true',
+                        help='не сохранять расписание с накладками учителей и кабинетов')
+    args = parser.parse_args(argv)
+
+    directory = args.directory or tempfile.mkdtemp(prefix='chngf-service-')
+    os.makedirs(directory, exist_ok=True)
+    options = {'ns_engine': args.ns_engine, 'html_engine': args.html_engine, 'match': args.match,
+               'check_conflicts': args.conflicts}
+    service = Service(directory, args.jobs, args.queue, options, args.retention)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        if not args.directory:
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
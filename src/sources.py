@@ -0,0 +1,56 @@
+import codecs
+import io
+import mmap
+import os
+import re
+from contextlib import contextmanager
+
+# Входные файлы читаются байтами и передаются парсеру без предварительного декодирования.
+# Источник - путь, bytes/bytearray/memoryview или mmap; кодировка берётся из BOM, XML-объявления
+# или meta-тега HTML, по умолчанию windows-1251 (выгрузки Хронографа и Сетевого города).
+DEFAULT_ENCODING = 'windows-1251'
+SNIFF_SIZE = 4096
+BOMS = [(codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+XML_DECLARATION = re.compile(rb'^\s*<\?xml\b[^>]*?\bencoding\s*=\s*["\']([\w.:-]+)["\']', re.IGNORECASE)
+HTML_CHARSET = re.compile(rb'<meta\b[^>]*?\bcharset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+
+def detect_encoding(head, default=DEFAULT_ENCODING):  # head - первые байты файла
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+
+    match = XML_DECLARATION.search(head) or HTML_CHARSET.search(head)
+    if match:
+        encoding = match.group(1).decode('ascii')
+        try:
+            codecs.lookup(encoding)
+        except LookupError:  # неизвестная кодировка в заголовке
+            return default
+        return encoding
+    return default
+
+
+def is_same_file(source, filename):  # source - путь к существующему файлу filename
+    if isinstance(source, (mmap.mmap, bytes, bytearray, memoryview)):
+        return False
+    try:
+        return os.path.samefile(source, filename)
+    except OSError:  # одного из файлов нет
+        return False
+
+
+@contextmanager
+def open_source(source):  # (двоичный файловый объект, кодировка)
+    if isinstance(source, mmap.mmap):
+        source.seek(0)
+        yield source, detect_encoding(source[:SNIFF_SIZE])
+        source.seek(0)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        # BytesIO над bytes не копирует буфер, пока в него не пишут
+        yield io.BytesIO(source), detect_encoding(bytes(source[:SNIFF_SIZE]))
+    else:
+        with open(os.fspath(source), 'rb') as f:
+            encoding = detect_encoding(f.read(SNIFF_SIZE))
+            f.seek(0)
+            yield f, encoding
@@ -0,0 +1,138 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Замер запуска GUI в отдельных процессах: время импорта gui (python -X importtime) и время до первого
+# показа окна. Результаты дописываются в JSON-файл и сравниваются с бюджетом и с предыдущим прогоном.
+# Тяжёлые зависимости разбора (bs4, lxml, numpy) при запуске импортироваться не должны.
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS = 'startup.json'
+IMPORT_BUDGET = 0.25  # с
+WINDOW_BUDGET = 1.0  # с
+REGRESSION_THRESHOLD = 0.1
+DEFERRED_MODULES = ('bs4', 'lxml', 'numpy', 'multiprocessing')  # импортируются только при загрузке файлов
+TOP_IMPORTS = 8
+
+# Окно создаётся как в gui.main, после первого прохода цикла событий процесс сообщает о готовности и выходит
+WINDOW_SCRIPT = '''
+import sys
+from PyQt5 import QtCore, QtWidgets
+import gui
+app = QtWidgets.QApplication(sys.argv)
+window = gui.TimeTableApp()
+window.show()
+QtCore.QTimer.singleShot(0, lambda: (print('ready', ' '.join(sorted(set(sys.modules) & set({modules!r})))), app.quit()))
+app.exec_()
+'''
+
+
+def run_python(args, platform_name=None):
+    env = dict(os.environ)
+    if platform_name:
+        env['QT_QPA_PLATFORM'] = platform_name
+    return subprocess.run([sys.executable, *args], cwd=SOURCE_DIRECTORY, env=env, capture_output=True, text=True,
+                          check=True)
+
+
+def parse_importtime(output):  # {модуль верхнего уровня gui: суммарное время, с}, время gui целиком
+    imports = {}
+    total = None
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # после '|' пробел и по два пробела на уровень
+        if name.strip() == 'gui' and depth == 0:
+            total = int(cumulative) / 1e6
+        elif depth == 1:  # непосредственные импорты gui (внутренние выводятся раньше своего родителя)
+            imports[name.strip()] = int(cumulative) / 1e6
+    return imports, total
+
+
+def measure_import():
+    result = run_python(['-X', 'importtime', '-c', 'import gui'])
+    return parse_importtime(result.stderr)
+
+
+def measure_window(platform_name=None):  # (время до окна, отложенные модули, импортированные при запуске)
+    start = time.perf_counter()
+    result = run_python(['-c', WINDOW_SCRIPT.format(modules=DEFERRED_MODULES)], platform_name)
+    elapsed = time.perf_counter() - start
+    line = next(line for line in result.stdout.splitlines() if line.startswith('ready'))
+    return elapsed, line.split()[1:]
+
+
+def load_runs(filename):
+    try:
+        with open(filename, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк запуска GUI: время импорта и время до показа окна')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='повторов, берётся лучший результат')
+    parser.add_argument('-o', '--results', default=DEFAULT_RESULTS, help='файл с историей результатов')
+    parser.add_argument('--label', default=None, help='метка прогона (версия, коммит)')
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET, help='бюджет импорта gui, с')
+    parser.add_argument('--window-budget', type=float, default=WINDOW_BUDGET, help='бюджет до показа окна, с')
+    parser.add_argument('--platform', help='платформа Qt (QT_QPA_PLATFORM), например offscreen для сервера')
+    args = parser.parse_args(argv)
+
+    imports = {}
+    import_times = []
+    window_times = []
+    eager = set()
+    for i in range(args.repeat):
+        run_imports, total = measure_import()
+        import_times.append(total)
+        for name, cumulative in run_imports.items():
+            imports[name] = min(cumulative, imports.get(name, cumulative))
+        window, loaded = measure_window(args.platform)
+        window_times.append(window)
+        eager.update(loaded)
+
+    results = {'import': min(import_times), 'window': min(window_times)}
+    runs = load_runs(args.results)
+    previous = runs[-1]['results'] if runs else {}
+
+    failed = 0
+    for name, value, budget in (('import', results['import'], args.import_budget),
+                                ('window', results['window'], args.window_budget)):
+        line = f'{"импорт gui" if name == "import" else "до показа окна":16} {value * 1000:8.1f} мс' \
+               f' (бюджет {budget * 1000:.0f} мс)'
+        if name in previous and previous[name]:
+            change = value / previous[name] - 1
+            line += f' {change:+8.1%}{"  !" if change > REGRESSION_THRESHOLD else ""}'
+        if value > budget:
+            failed += 1
+            line += '  !!! превышен бюджет'
+        print(line)
+
+    print('\nСамые долгие импорты gui:')
+    for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:TOP_IMPORTS]:
+        print(f'  {name:30} {cumulative * 1000:8.1f} мс')
+    if eager:
+        failed += 1
+        print(f'\n!!! при запуске импортированы модули разбора: {", ".join(sorted(eager))}')
+
+    runs.append({
+        'label': args.label,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'results': results,
+        'imports': imports,
+    })
+    with open(args.results, 'w', encoding='utf-8') as f:
+        json.dump(runs, f, ensure_ascii=False, indent=1)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
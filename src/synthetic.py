@@ -0,0 +1,192 @@
+import argparse
+import math
+import os
+import random
+
+import converter
+
+# Генератор синтетических выгрузок: расписание классов Хронографа (HTML) и файл Сетевого города (NSXML)
+SUBJECTS = [  # (название, сокращение, занятия по группам)
+    ('Русский язык', 'Рус', False),
+    ('Литература', 'Лит', False),
+    ('Алгебра', 'Алг', False),
+    ('Геометрия', 'Геом', False),
+    ('Физика', 'Физ', False),
+    ('Химия', 'Хим', False),
+    ('Биология', 'Биол', False),
+    ('История', 'Ист', False),
+    ('Обществознание', 'Общ', False),
+    ('География', 'Геог', False),
+    ('Физическая культура', 'Физ-ра', False),
+    ('Английский язык', 'Англ', True),
+    ('Информатика и ИКТ', 'Инф', True),
+    ('Технология', 'Техн', True),
+]
+LASTNAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов', 'Новиков',
+             'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров', 'Павлов', 'Козлов',
+             'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров', 'Никитин', 'Захаров']
+FIRSTNAMES = ['Анна', 'Мария', 'Елена', 'Ольга', 'Татьяна', 'Наталья', 'Ирина', 'Светлана', 'Юлия', 'Галина',
+              'Алексей', 'Сергей', 'Дмитрий', 'Андрей', 'Михаил']
+MIDNAMES = ['Александровна', 'Сергеевна', 'Владимировна', 'Николаевна', 'Ивановна', 'Петровна', 'Юрьевна',
+            'Викторовна', 'Олеговна', 'Борисовна', 'Андреевна', 'Павловна']
+LETTERS = 'абвгдежзиклмнопрстуфхцчшэюя'
+BELLS = ['8:30-9:15', '9:25-10:10', '10:30-11:15', '11:35-12:20', '12:30-13:15', '13:25-14:10', '14:20-15:05',
+         '15:15-16:00', '16:10-16:55', '17:05-17:50']
+
+
+class Teacher:
+    def __init__(self, id, index):
+        self.id = str(id)
+        self.lastname = LASTNAMES[index % len(LASTNAMES)]
+        index //= len(LASTNAMES)
+        self.firstname = FIRSTNAMES[index % len(FIRSTNAMES)]
+        index //= len(FIRSTNAMES)
+        self.midname = MIDNAMES[index % len(MIDNAMES)]
+        if self.firstname in ('Алексей', 'Сергей', 'Дмитрий', 'Андрей', 'Михаил'):
+            self.midname = self.midname[:-3] + 'вич'
+        else:
+            self.lastname += 'а'
+        self.name = f'{self.lastname} {self.firstname[0]}.{self.midname[0]}.'
+
+
+class School:
+    def __init__(self, classes, lessons, days, seed=0):
+        self.random = random.Random(seed)
+        self.lessons_number = lessons
+        self.days_number = days
+        self.ids = seed * 100000  # id классов и уроков NS уникальны на сервере, у школ с разным seed они разные
+
+        self.teachers = [Teacher(i + 1, i) for i in range(max(len(SUBJECTS), math.ceil(classes * 1.5)))]
+        self.rooms = [str(100 + i) for i in range(max(10, classes + 5))]
+
+        per_grade = min(max(1, math.ceil(classes / 11)), len(LETTERS))
+        self.class_names = [f'{1 + i // per_grade}{LETTERS[i % per_grade]}' for i in range(classes)]
+
+        # План: класс -> [(id урока, предмет, учитель)], у предметов по группам по уроку на группу
+        self.plan = {}
+        lesson_id = self.ids + 1000
+        for class_i, class_name in enumerate(self.class_names):
+            plan = []
+            for subject_i, subject in enumerate(SUBJECTS):
+                for group in range(2 if subject[2] else 1):
+                    lesson_id += 1
+                    teacher = self.teachers[(class_i * 7 + subject_i * 3 + group) % len(self.teachers)]
+                    plan.append((str(lesson_id), subject_i, teacher))
+            self.plan[class_name] = plan
+
+        # Сетка: (класс, день, урок) -> [(предмет, учитель, номер группы)]
+        self.grid = {}
+        for class_name in self.class_names:
+            plan = self.plan[class_name]
+            for day in range(days):
+                for number in range(self.random.randint(max(1, lessons - 2), lessons)):
+                    subject_i = self.random.choice(plan)[1]
+                    group_lessons = [lesson for lesson in plan if lesson[1] == subject_i]
+                    if len(group_lessons) > 1:
+                        cell = [(subject_i, lesson[2], group) for group, lesson in enumerate(group_lessons, start=1)]
+                        if self.random.random() < 0.3:  # у второй группы другой предмет
+                            other = self.random.choice(plan)
+                            cell[1] = (other[1], other[2], 2)
+                    else:
+                        cell = [(subject_i, group_lessons[0][2], None)]
+                    self.grid[class_name, day, number] = cell
+
+    def write_html(self, filename):
+        days = converter.TimetableConverter.DAYS
+        with open(filename, 'w', encoding='windows-1251') as f:
+            f.write('<html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1251">'
+                    '<title>Расписание классов</title></head><body>\n')
+            f.write(f'<table border="1" cellspacing="0"><tr><td colspan="{len(self.class_names) + 3}">'
+                    f'Расписание классов</td></tr>\n<tr><td colspan="{len(self.class_names) + 3}">'
+                    f'Синтетическая школа</td></tr>\n<tr>\n<td>&nbsp;</td>\n<td>№</td>\n<td>Время</td>')
+            for class_name in self.class_names:
+                f.write(f'\n<td>{class_name.upper()}</td>')
+            f.write('</tr>\n')
+
+            for day in range(self.days_number):
+                for number in range(self.lessons_number):
+                    f.write('<tr>')
+                    if number == 0:
+                        f.write(f'\n<td style=";text-align:left" rowspan="{self.lessons_number}">'
+                                f'{days[day].name.title()}</td>')
+                    f.write(f'\n<td>{number + 1}</td>\n<td>{BELLS[number % len(BELLS)]}</td>')
+                    for class_name in self.class_names:
+                        f.write(f'\n<td>{self.get_cell(class_name, day, number)}</td>')
+                    f.write('</tr>\n')
+            f.write('</table></body></html>\n')
+
+    def get_cell(self, class_name, day, number):
+        cell = self.grid.get((class_name, day, number))
+        if not cell:
+            return '&nbsp;'
+
+        lesson_block = ''
+        rooms = []
+        previous = None
+        for subject_i, teacher, group in cell:
+            name = SUBJECTS[subject_i][0]
+            if previous is not None:  # продолжение для следующей группы
+                name = '/' if subject_i == previous else '/' + name
+            teacher_name = f'{group}:{teacher.name}' if group else teacher.name
+            lesson_block += f'<span class="subject">{name}</span><span class="teacher">{teacher_name}</span>'
+            rooms.append(self.rooms[(int(teacher.id) + number) % len(self.rooms)])
+            previous = subject_i
+        return f'<div><div>{lesson_block}</div><div class="room">{"/".join(rooms)}</div></div>'
+
+    def write_nsxml(self, filename):
+        days = converter.TimetableConverter.DAYS
+        with open(filename, 'w', encoding='windows-1251') as f:
+            f.write('<?xml version="1.0" encoding="windows-1251"?>\n<TimetableExchange>\n<Teachers>\n')
+            for teacher in self.teachers:
+                f.write(f'\t<Teacher tid="{teacher.id}" firstname="{teacher.firstname}" '
+                        f'lastname="{teacher.lastname}" middlename="{teacher.midname}"/>\n')
+            f.write('</Teachers>\n<Rooms>\n')
+            for room_i, room in enumerate(self.rooms, start=1):
+                f.write(f'\t<Room id="{room_i}" name="{room}"/>\n')
+            f.write('</Rooms>\n<Subjects>\n')
+            for subject_i, (name, abbr, groups) in enumerate(SUBJECTS, start=1):
+                f.write(f'\t<Subject sid="{subject_i}" name="{name}" abbr="{abbr}"/>\n')
+            f.write('</Subjects>\n<Plan>\n')
+            for class_i, class_name in enumerate(self.class_names, start=1):
+                f.write(f'\t<Class id="{self.ids + class_i}" name="{class_name}" boys="{12 + class_i % 5}" '
+                        f'girls="{11 + class_i % 7}">\n')
+                for lesson_id, subject_i, teacher in self.plan[class_name]:
+                    f.write(f'\t\t<Lesson id="{lesson_id}" name="{SUBJECTS[subject_i][0]}" tid="{teacher.id}" '
+                            f'sid="{subject_i + 1}"/>\n')
+                f.write('\t</Class>\n')
+            f.write('</Plan>\n<Week>\n')
+            for day in range(self.days_number):  # прошлая неделя, которую заменит конвертер
+                f.write(f'<Day id="{day + 1}" name="{days[day].name}" wd="{day + 2}" >\n')
+                for number in range(self.lessons_number):
+                    f.write(f'\t<Lesson timeId="{number + 1}">\n')
+                    for class_name in self.class_names:
+                        if (class_name, day, number) in self.grid:
+                            f.write(f'\t\t<csg id="{self.plan[class_name][0][0]}"/>\n')
+                    f.write('\t</Lesson>\n')
+                f.write('</Day>\n')
+            f.write('</Week>\n</TimetableExchange>\n')
+
+    def write(self, directory, name='school'):
+        html = os.path.join(directory, name + '.html')
+        nsxml = os.path.join(directory, name + '.nsxml')
+        self.write_html(html)
+        self.write_nsxml(nsxml)
+        return html, nsxml
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Генерация синтетических выгрузок Хронографа и Сетевого города')
+    parser.add_argument('directory')
+    parser.add_argument('-c', '--classes', type=int, default=30)
+    parser.add_argument('-l', '--lessons', type=int, default=7, help='уроков в день')
+    parser.add_argument('-d', '--days', type=int, default=6, choices=range(1, 7), help='рабочих дней')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.directory, exist_ok=True)
+    for filename in School(args.classes, args.lessons, args.days, args.seed).write(args.directory):
+        print(filename)
+
+
+if __name__ == '__main__':
+    main()
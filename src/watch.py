@@ -0,0 +1,158 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+
+import converter
+import mappings
+import preflight
+import weeks
+from exceptions import HTMLException, NSException, PreflightException
+
+# Слежение за каталогом выгрузок Хронографа: при изменении HTML-файла перечитываются только изменившиеся
+# строки сетки, NSXML пересоздаётся, а в консоль выводится список изменившихся уроков.
+PATTERNS = ('*.html', '*.htm')
+DEFAULT_INTERVAL = 2.0
+
+
+class Watcher:
+    def __init__(self, directory, nsxml, output_directory, mapping=None, ns_engine='iterparse', html_engine='xpath',
+                 match=False, store=None):
+        self.directory = directory
+        self.nsxml = nsxml
+        self.output_directory = output_directory
+        self.html_engine = html_engine
+        self.match = match
+
+        self.ns_parser = converter.NS_PARSERS[ns_engine](detach=True)
+        self.ns_parser.load(nsxml)
+        self.ns_parser.parse_all()
+
+        self.corellations = {}
+        if mapping:
+            with open(mapping, encoding='utf-8') as f:
+                self.corellations = json.load(f)
+
+        self.store = None
+        if store:
+            self.store = mappings.MappingStore(store).load()
+            stale = self.store.get_stale(self.ns_parser)
+            if stale:
+                print(f'Устаревших соответствий в {store}: {len(stale)}')
+
+        self.parsers = {}  # путь -> HTMLParser с прошлого разбора
+        self.stats = {}  # путь -> (mtime, размер) обработанного файла
+        self.pending = {}  # путь -> (mtime, размер) при прошлом опросе, файл мог сохраняться не до конца
+
+    def get_files(self):
+        files = set()
+        for pattern in PATTERNS:
+            files.update(glob.glob(os.path.join(self.directory, pattern)))
+        return sorted(files)
+
+    def get_output(self, filename):  # выгрузка рядом с файлом Сетевого города не должна его перезаписать
+        return weeks.get_outputs([filename], self.output_directory, self.nsxml)[0][1]
+
+    def scan(self):  # обрабатывает файлы, которые изменились и не менялись с прошлого опроса
+        for filename in self.get_files():
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            stat = stat.st_mtime_ns, stat.st_size
+
+            if self.stats.get(filename) == stat:
+                continue
+            if self.pending.get(filename) != stat:
+                self.pending[filename] = stat
+                continue
+
+            del self.pending[filename]
+            self.stats[filename] = stat
+            try:
+                self.update(filename)
+            except (Exception, NSException, HTMLException, PreflightException):  # исключения проекта - BaseException
+                print(f'[ОШИБКА] {filename}\n{traceback.format_exc()}', file=sys.stderr)
+
+    def update(self, filename):
+        preflight.check(filename, self.nsxml)
+        parser = self.parsers.get(filename)
+        if parser is None:
+            parser = converter.HTML_PARSERS[self.html_engine](track_changes=True, detach=True)
+            parser.load(filename)
+            parser.set_classes(self.ns_parser.plans)
+            parser.parse()
+            parser.set_corellations(self.corellations, self.ns_parser)
+            if self.store:
+                self.store.apply(parser, self.ns_parser)
+            changes = None
+        else:
+            changes = parser.reparse(filename)
+
+        if self.match:
+            parser.get_subjects_set()
+            parser.match_subjects(self.ns_parser)
+
+        output = self.get_output(filename)
+        writer = converter.NSWriter.from_plan(parser.compile())
+        writer.write(self.nsxml, output)
+        self.parsers[filename] = parser
+
+        self.report(filename, output, changes)
+
+    def report(self, filename, output, changes):
+        now = datetime.datetime.now().strftime('%H:%M:%S')
+        if changes is None:
+            print(f'[{now}] {os.path.basename(filename)}: загружен, сохранён {output}')
+            return
+
+        print(f'[{now}] {os.path.basename(filename)}: изменено уроков {len(changes)}, сохранён {output}')
+        for class_, (day_num, lesson_num), old, new in changes:
+            print(f'  {class_.name}, {converter.TimetableConverter.DAYS[day_num].name}, {lesson_num + 1} урок: '
+                  f'{format_lessons(old)} -> {format_lessons(new)}')
+
+    def run(self, interval=DEFAULT_INTERVAL):
+        while True:
+            self.scan()
+            time.sleep(interval)
+
+
+def format_lessons(lessons):
+    if not lessons:
+        return '—'
+    return ' / '.join(f'{lesson.get_subject()} ({lesson.room})' for lesson in lessons)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Автоматическая конвертация изменённых выгрузок Хронографа')
+    parser.add_argument('directory', help='каталог с HTML-выгрузками Хронографа')
+    parser.add_argument('nsxml', help='файл Сетевого города')
+    parser.add_argument('-o', '--output', metavar='DIR', help='каталог для NSXML (по умолчанию - каталог выгрузок)')
+    parser.add_argument('-m', '--mapping', help='соответствия предметов {класс: {id урока NS: "Предмет — Учитель"}}')
+    parser.add_argument('-i', '--interval', type=float, default=DEFAULT_INTERVAL, help='период опроса, с')
+    parser.add_argument('--ns-engine', choices=converter.NS_PARSERS, default='iterparse')
+    parser.add_argument('--html-engine', choices=converter.HTML_PARSERS, default='xpath')
+    parser.add_argument('--match', action='store_true',
+                        help='автоматически сопоставить предметы, не указанные в mapping')
+    parser.add_argument('--store', metavar='FILE', help='файл сохранённых соответствий предметов (mappings.json)')
+    args = parser.parse_args(argv)
+
+    output_directory = args.output or args.directory
+    os.makedirs(output_directory, exist_ok=True)
+
+    watcher = Watcher(args.directory, args.nsxml, output_directory, args.mapping, args.ns_engine, args.html_engine,
+                      args.match, args.store)
+    print(f'Слежение за {args.directory}, Ctrl+C - выход')
+    try:
+        watcher.run(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
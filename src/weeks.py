@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import as_completed
+
+import converter
+import mappings
+import preflight
+from sources import is_same_file
+
+# Выгрузка нескольких недель (чётная/нечётная, замены в середине четверти) с одним файлом Сетевого города:
+# NSXML разбирается один раз, модель передаётся процессам пула при их запуске, а сохранённые соответствия
+# применяются к каждой HTML-выгрузке Хронографа. На каждую неделю пишется свой NSXML.
+exporter = None  # WeekExporter процесса пула
+
+
+class WeekExporter:
+    def __init__(self, ns_parser, nsxml, corellations, html_class=converter.HTMLXPathParser, match=False,
+                 store=None):
+        self.ns_parser = ns_parser
+        self.nsxml = nsxml
+        self.corellations = corellations  # {класс: {id урока NS: "Предмет — Учитель"}}
+        self.html_class = html_class
+        self.match = match
+        self.store = store  # MappingStore для уроков, которых нет в corellations
+
+    def export(self, html, output):  # {класс: уроков без соответствия в NS}
+        preflight.check(html, self.nsxml)
+        html_parser = self.html_class(detach=True)
+        html_parser.load(html)
+        html_parser.set_classes(self.ns_parser.plans)
+        html_parser.parse()
+        html_parser.set_corellations(self.corellations, self.ns_parser)
+        if self.store:
+            self.store.apply(html_parser, self.ns_parser)
+
+        if self.match:
+            html_parser.get_subjects_set()
+            html_parser.match_subjects(self.ns_parser)
+
+        plan = html_parser.compile()
+        converter.NSWriter.from_plan(plan).write(self.nsxml, output)
+        return plan.get_unmapped()
+
+
+def init_worker(ns_class, model, nsxml, corellations, html_class, match, store):
+    global exporter
+    ns_parser = ns_class()
+    ns_parser.set_model(model)
+    exporter = WeekExporter(ns_parser, nsxml, corellations, html_class, match, store)
+
+
+def run_week(html, output):  # (время, {класс: несопоставлено} или None, текст ошибки или None)
+    start = time.perf_counter()
+    try:
+        unmapped = exporter.export(html, output)
+    except BaseException:
+        return time.perf_counter() - start, None, traceback.format_exc()
+    return time.perf_counter() - start, unmapped, None
+
+
+def export_weeks(ns_parser, nsxml, weeks, corellations, html_class=converter.HTMLXPathParser, match=False,
+                 workers=None, store=None):
+    # weeks - [(HTML, NSXML для результата)], выдаёт (HTML, NSXML, время, несопоставлено, ошибка) по готовности
+    workers = min(workers or os.cpu_count(), len(weeks))
+    if workers <= 1:  # пул не окупается
+        global exporter
+        exporter = WeekExporter(ns_parser, nsxml, corellations, html_class, match, store)
+        for html, output in weeks:
+            yield (html, output, *run_week(html, output))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor  # модуль пула тянет multiprocessing, GUI он нужен не всегда
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(type(ns_parser), ns_parser.get_model(), nsxml, corellations, html_class,
+                                       match, store)) as pool:
+        futures = {pool.submit(run_week, html, output): (html, output) for html, output in weeks}
+        for future in as_completed(futures):
+            html, output = futures[future]
+            try:
+                result = future.result()
+            except BaseException:  # процесс пула упал целиком
+                result = 0, None, traceback.format_exc()
+            yield (html, output, *result)
+
+
+def get_key(filename):
+    return os.path.normcase(os.path.abspath(filename))
+
+
+def get_outputs(htmls, output_directory, nsxml):
+    # [(HTML, NSXML для результата)]: имя HTML с расширением .nsxml, при совпадении с исходным NSXML, входными
+    # файлами или другой неделей добавляется номер (school-2.nsxml)
+    used = {get_key(filename) for filename in (nsxml, *htmls)}
+    weeks = []
+    for html in htmls:
+        stem = os.path.join(output_directory, os.path.splitext(os.path.basename(html))[0])
+        output = stem + '.nsxml'
+        number = 1
+        while get_key(output) in used or is_same_file(nsxml, output):
+            number += 1
+            output = f'{stem}-{number}.nsxml'
+        used.add(get_key(output))
+        weeks.append((html, output))
+    return weeks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Конвертация нескольких недель Хронографа с одним файлом '
+                                                 'Сетевого города')
+    parser.add_argument('nsxml', help='файл Сетевого города')
+    parser.add_argument('html', nargs='+', help='HTML-выгрузки Хронографа, по одной на неделю')
+    parser.add_argument('-m', '--mapping', help='соответствия предметов {класс: {id урока NS: "Предмет — Учитель"}}')
+    parser.add_argument('-o', '--output', metavar='DIR', default='.', help='каталог для NSXML')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='количество процессов')
+    parser.add_argument('--ns-engine', choices=converter.NS_PARSERS, default='iterparse')
+    parser.add_argument('--html-engine', choices=converter.HTML_PARSERS, default='xpath')
+    parser.add_argument('--match', action='store_true',
+                        help='автоматически сопоставить предметы, не указанные в mapping')
+    parser.add_argument('--store', metavar='FILE', help='файл сохранённых соответствий предметов (mappings.json)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    corellations = {}
+    if args.mapping:
+        with open(args.mapping, encoding='utf-8') as f:
+            corellations = json.load(f)
+
+    start = time.perf_counter()
+    ns_parser = converter.NS_PARSERS[args.ns_engine](detach=True)
+    ns_parser.load(args.nsxml)
+    ns_parser.parse_all()
+    print(f'Сетевой город разобран за {time.perf_counter() - start:.2f} с')
+
+    store = None
+    if args.store:
+        store = mappings.MappingStore(args.store).load()
+        stale = store.get_stale(ns_parser)
+        if stale:
+            print(f'Устаревших соответствий в {args.store}: {len(stale)}')
+
+    weeks = get_outputs(args.html, args.output, args.nsxml)
+    failed = 0
+    for html, output, elapsed, unmapped, error in export_weeks(ns_parser, args.nsxml, weeks, corellations,
+                                                               converter.HTML_PARSERS[args.html_engine],
+                                                               args.match, args.jobs, store):
+        if error:
+            failed += 1
+            print(f'[ОШИБКА] {elapsed:7.2f} с  {html}\n{error}', file=sys.stderr)
+        else:
+            print(f'[OK]     {elapsed:7.2f} с  {output} (без соответствия уроков: {sum(unmapped.values())})')
+
+    print(f'Готово: {len(weeks) - failed} из {len(weeks)} за {time.perf_counter() - start:.2f} с')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())